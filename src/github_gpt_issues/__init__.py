@@ -0,0 +1,21 @@
+"""github-gpt-issues: turn markdown user stories into GitHub issues."""
+
+from github_gpt_issues._parse import parse_markdown
+
+__all__ = [
+    "parse_markdown",
+    "expand_story",
+    "expand_stories_batch",
+    "create_milestone_and_issues",
+    "create_all_milestones_and_issues",
+]
+
+
+def __getattr__(name):
+    # core pulls in openai and PyGithub; load it on first use so the CLI's
+    # --help and --run-tests paths stay fast
+    if name in __all__:
+        from github_gpt_issues import core
+
+        return getattr(core, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
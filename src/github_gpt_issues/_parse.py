@@ -0,0 +1,53 @@
+"""
+Markdown parsing for github-gpt-issues.
+
+Kept free of third-party imports and fully annotated so it can be compiled
+with mypyc (`just build-parser`). The compiled extension is picked up by
+the normal import system in preference to this file when present.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+# Matched against single lines, and only after a cheap prefix check:
+# most markdown lines are prose and never reach the regex engine.
+_SECTION_RE = re.compile(r"##\s+(\d+)\.\s+(.+)$")
+_STORY_RE = re.compile(r"\s*\d+\.\d+\.\s*\*\*(.+?)\*\*")
+
+
+def parse_markdown(markdown_text: str) -> List[Dict[str, Any]]:
+    """
+    Parse sections and user-story actor lines from markdown text.
+
+    Returns:
+      List[Dict]: each dict has keys: 'number', 'title', 'stories'
+    """
+    sections: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    stories: List[str] = []
+    for line in markdown_text.splitlines():
+        if line[:2] == "##":
+            sec = _SECTION_RE.match(line)
+            if sec:
+                stories = []
+                current = {
+                    "number": sec.group(1),
+                    "title": sec.group(2).strip(),
+                    "stories": stories,
+                }
+                sections.append(current)
+                continue
+        if current is None:
+            continue
+        first = line[:1]
+        if first.isdigit() or (first.isspace() and line.lstrip()[:1].isdigit()):
+            st = _STORY_RE.match(line)
+            if st:
+                stories.append(st.group(1).strip())
+
+    return sections
+
+
+def normalize_actor_line(actor_line: str) -> str:
+    """Key for comparing actor lines, ignoring surrounding whitespace and case."""
+    return actor_line.strip().casefold()
@@ -4,9 +4,13 @@ Core functionality for github-gpt-issues:
 - parse_markdown
 - expand_story (single) with caching and retry
 - expand_stories_batch (batch)
-- create_milestone_and_issues
+- create_milestone_and_issues (concurrent issue creation)
+- create_all_milestones_and_issues (sections processed concurrently)
 """
+
+import email.utils
 import functools
+import hashlib
 import os
 import json
 import re
@@ -14,7 +18,10 @@ import openai
 import time
 import random
 import logging
-
+import threading
+import types
+from collections.abc import MutableSet
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Gracefully handle missing openai.error for tests
 # fmt: off
@@ -31,72 +38,777 @@ except ImportError:
         pass
 # fmt: on
 
+# Outage errors counted by the circuit breaker, imported separately so an
+# SDK lacking one of them keeps the real RateLimitError and APIError above
+try:
+    import openai.error as _openai_errors
+except ImportError:
+    _openai_errors = None
+
 from github import GithubException
 
+from github_gpt_issues._parse import normalize_actor_line, parse_markdown
+
+
+class _MissingOpenAIError(Exception):
+    """Dummy for an openai.error class the installed SDK does not define"""
+
+
+APIConnectionError, ServiceUnavailableError, Timeout, TryAgain = (
+    getattr(_openai_errors, name, None) or type(name, (_MissingOpenAIError,), {})
+    for name in ("APIConnectionError", "ServiceUnavailableError", "Timeout", "TryAgain")
+)
+
+# orjson (in requirements.txt) is a faster drop-in for JSON on the cache
+# and function-call paths; the stdlib is used if it cannot be installed.
+# _dumps always returns UTF-8 bytes.
+try:
+    import orjson
+
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+
 logger = logging.getLogger(__name__)
 
+# Upper bound on simultaneous API requests; override with GGI_CONCURRENCY
+DEFAULT_MAX_WORKERS = 8
+
+
+def _max_workers():
+    try:
+        return max(1, int(os.getenv("GGI_CONCURRENCY", DEFAULT_MAX_WORKERS)))
+    except ValueError:
+        logger.warning("Invalid GGI_CONCURRENCY; using %d", DEFAULT_MAX_WORKERS)
+        return DEFAULT_MAX_WORKERS
+
+
+# Sections processed at once by create_all_milestones_and_issues; GGI_SECTIONS
+DEFAULT_SECTION_WORKERS = 4
+
+# Retry budgets used by _retry when the caller does not pass max_retries
+DEFAULT_RETRIES = 3
+RATE_LIMIT_RETRIES = 8
+
+# Consecutive OpenAI server errors that open the circuit, and for how long
+CIRCUIT_FAILURES = 5
+CIRCUIT_RESET_SECONDS = 30.0
+
+# Actor-line tokens per batch request, counted with tiktoken; override with GGI_BATCH_TOKENS
+DEFAULT_BATCH_TOKENS = 1000
+# Stories per batch request, so one slow response holds back only a few
+DEFAULT_BATCH_SIZE = 10
+# Seconds to wait on a Batch API job before falling back (the job's own
+# completion window); override with GGI_BATCH_MAX_WAIT
+DEFAULT_BATCH_MAX_WAIT = 24 * 3600
+
+
+class _TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` tokens
+    per minute. acquire() blocks until enough tokens are available.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        # A single request larger than the bucket would otherwise wait forever
+        n = min(n, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self.updated
+                self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            # Sleep without the lock so small requests are not held up behind
+            # a large one; whoever wakes first re-checks the refilled bucket
+            time.sleep(wait)
+
+
+@functools.lru_cache(maxsize=None)
+def _token_bucket(env_var):
+    """Process-wide bucket configured from env_var, or None when unset."""
+    value = os.getenv(env_var)
+    if not value:
+        return None
+    try:
+        return _TokenBucket(float(value))
+    except ValueError:
+        logger.warning("Invalid %s=%r; rate limit disabled", env_var, value)
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def _openai_slots():
+    """
+    Process-wide cap of GGI_CONCURRENCY OpenAI requests in flight. Worker
+    pools nest (sections, sub-batches, per-story fallbacks), so their sizes
+    alone do not bound the total.
+    """
+    return threading.BoundedSemaphore(_max_workers())
+
+
+@functools.lru_cache(maxsize=1)
+def _github_slots():
+    """
+    Process-wide cap of GGI_CONCURRENCY GitHub writes in flight. Every
+    section runs its own issue-creation pool, and GitHub's secondary rate
+    limits punish bursts of concurrent content-creating requests.
+    """
+    return threading.BoundedSemaphore(_max_workers())
+
+
+def _github_write(func, **kwargs):
+    with _github_slots():
+        return func(**kwargs)
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding_for(model):
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        # tiktoken missing or model unknown: about 4 characters per token, rounded up
+        return None
+
+
+def _estimate_tokens(model, text):
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
 
-def parse_markdown(markdown_text):
+def _connection_pool_size():
+    # _openai_slots and _github_slots each cap requests in flight at this
+    return _max_workers()
+
+
+def configure_http_session(pool_size=None):
+    """
+    Route all OpenAI calls through one keep-alive requests.Session.
+
+    Without this the openai SDK opens a session per thread, so every
+    short-lived worker pool pays fresh TCP and TLS handshakes. The pool
+    holds one connection per request _openai_slots lets be in flight
+    (GGI_CONCURRENCY), so none is opened only to be discarded or left idle.
     """
-    Parse sections and user-story actor lines from markdown text.
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    size = pool_size or _connection_pool_size()
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=size, pool_maxsize=size))
+    openai.requestssession = session
+    return session
+
+
+def _chat_completion(**kwargs):
+    """
+    openai.ChatCompletion.create paced below the account quota: requests
+    per minute (GGI_RPM) and prompt tokens per minute (GGI_TPM).
+    """
+    requests_bucket = _token_bucket("GGI_RPM")
+    if requests_bucket:
+        requests_bucket.acquire(1)
+    tokens_bucket = _token_bucket("GGI_TPM")
+    if tokens_bucket:
+        prompt = "".join(m["content"] for m in kwargs["messages"])
+        tokens_bucket.acquire(_estimate_tokens(kwargs["model"], prompt))
+    return openai.ChatCompletion.create(**kwargs)
+
+
+class _StreamedMessage:
+    """Chat message reassembled from streamed deltas."""
+
+    def __init__(self, content, function_call):
+        self.content = content
+        self.function_call = function_call
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
 
-    Returns:
-      List[Dict]: each dict has keys: 'number', 'title', 'stories'
+
+def _collect_stream(chunks):
+    content, name, arguments = [], None, []
+    for chunk in chunks:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.get("content"):
+            content.append(delta["content"])
+        function_call = delta.get("function_call")
+        if function_call:
+            name = function_call.get("name") or name
+            arguments.append(function_call.get("arguments") or "")
+    if name is None and not arguments:
+        return _StreamedMessage("".join(content), None)
+    return _StreamedMessage(
+        "".join(content) or None,
+        types.SimpleNamespace(name=name, arguments="".join(arguments)),
+    )
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling OpenAI while the circuit breaker is open."""
+
+
+class _CircuitBreaker:
     """
-    section_pattern = re.compile(r"^##\s+(\d+)\.\s+(.+)$", re.MULTILINE)
-    story_pattern = re.compile(r"^\s*\d+\.\d+\.\s*\*\*(.+?)\*\*", re.MULTILINE)
-    sections = []
-    current = None
-    for line in markdown_text.splitlines():
-        sec = section_pattern.match(line)
-        if sec:
-            current = {
-                "number": sec.group(1),
-                "title": sec.group(2).strip(),
-                "stories": [],
-            }
-            sections.append(current)
-        elif current:
-            st = story_pattern.match(line)
-            if st:
-                current["stories"].append(st.group(1).strip())
+    Fails calls fast once `threshold` consecutive calls have failed, for
+    reset_seconds; then lets one trial call through (half-open) and closes
+    again if it succeeds, or reopens if it fails.
+    """
+
+    def __init__(self, threshold=CIRCUIT_FAILURES, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.trial or waited < self.reset_seconds:
+                raise CircuitOpenError(
+                    f"OpenAI failing; not calling it for {self.reset_seconds:.0f}s"
+                )
+            self.trial = True
+
+    def record(self, failed):
+        """
+        Record a call's outcome: True for an outage, False for a success,
+        None for neither (e.g. a rejected request), which only ends a trial.
+        """
+        with self.lock:
+            self.trial = False
+            if failed is None:
+                return
+            if not failed:
+                self.reset()
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(
+                        "%d OpenAI failures in a row; pausing calls for %.0fs",
+                        self.failures,
+                        self.reset_seconds,
+                    )
+                self.opened_at = time.monotonic()
+
+
+_OPENAI_BREAKER = _CircuitBreaker()
+
+# openai 0.x errors for an unreachable or overloaded API; none of them is
+# an APIError subclass
+_OUTAGE_ERRORS = (Timeout, APIConnectionError, ServiceUnavailableError, TryAgain)
+
+
+def _is_outage(exc):
+    """True if exc means OpenAI is down, rather than our request being bad."""
+    if isinstance(exc, _OUTAGE_ERRORS):
+        return True
+    if not isinstance(exc, APIError) or _is_context_overflow(exc):
+        return False
+    status = _status_code(exc)
+    return not isinstance(status, int) or status >= 500
+
+
+def _request_message(stream, **kwargs):
+    """
+    The first choice's message for a chat completion. With stream=True the
+    response is consumed as it is generated, so long batch payloads are
+    assembled while the model is still producing them; consuming happens
+    inside the caller's _retry, so a dropped stream is retried too.
+
+    During an outage _OPENAI_BREAKER raises CircuitOpenError instead of
+    calling the API, so callers fall back at once instead of retrying.
+    """
+    _OPENAI_BREAKER.before_call()
+    failed = None
+    try:
+        with _openai_slots():
+            if not stream:
+                message = _chat_completion(**kwargs).choices[0].message
+            else:
+                message = _collect_stream(_chat_completion(stream=True, **kwargs))
+        failed = False
+        return message
+    except Exception as e:
+        # Only outages count; other errors neither open nor close the circuit
+        if _is_outage(e):
+            failed = True
+        raise
+    finally:
+        _OPENAI_BREAKER.record(failed)
+
+
+def _header(exc, name):
+    headers = getattr(exc, "headers", None) or {}
+    return next((v for k, v in headers.items() if k.lower() == name), None)
+
+
+def _retry_after(exc):
+    """
+    Seconds the server asked us to wait: a Retry-After header, given either
+    as delta-seconds or as an HTTP-date, or else the time until GitHub's
+    X-RateLimit-Reset once X-RateLimit-Remaining hits zero. None when absent.
+    """
+    value = _header(exc, "retry-after")
+    if value is None:
+        reset = _header(exc, "x-ratelimit-reset")
+        if reset is None or str(_header(exc, "x-ratelimit-remaining")) != "0":
+            return None
+        try:
+            return max(0.0, float(reset) - time.time())
+        except (TypeError, ValueError):
+            return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _status_code(exc):
+    # openai 0.x errors carry http_status; GithubException carries status
+    return getattr(exc, "http_status", None) or getattr(exc, "status", None)
 
-    return sections
+
+def _is_rate_limited(exc):
+    """True for OpenAI rate limits and GitHub primary/secondary rate limits."""
+    if isinstance(exc, RateLimitError):
+        return True
+    return _status_code(exc) in (403, 429) and (
+        _retry_after(exc) is not None or "rate limit" in str(exc).lower()
+    )
+
+
+def _is_client_error(exc):
+    # GitHub 4xx responses (bad request, not found, validation failed,
+    # forbidden) fail the same way on every attempt
+    if not isinstance(exc, GithubException) or _is_rate_limited(exc):
+        return False
+    status = _status_code(exc)
+    return isinstance(status, int) and 400 <= status < 500
 
 
 def _retry(
     func,
     *args,
-    max_retries=3,
+    max_retries=None,
     initial_delay=1.0,
     backoff_multiplier=2.0,
-    jitter=False,
+    jitter=True,
+    max_delay=30.0,
     **kwargs,
 ):
-    delay = initial_delay
+    """
+    Call func, retrying rate-limit and transient API errors with
+    exponential backoff capped at max_delay (a quarter of it for 5xx
+    responses). With jitter, each wait is
+    drawn uniformly from [0, delay] ("full jitter") so parallel callers do
+    not retry in lockstep; a server-provided Retry-After always sets the
+    floor. GitHub 4xx errors other than rate limits are raised at once.
+    Unless max_retries is given, rate limits are retried up to
+    RATE_LIMIT_RETRIES times and other errors DEFAULT_RETRIES times.
+    """
     retryable_exceptions = (RateLimitError, APIError, GithubException)
     callable_func = (
         func if not args and not kwargs else functools.partial(func, *args, **kwargs)
     )
 
-    for attempt in range(max_retries + 1):
+    attempt = 0
+    while True:
         try:
             return callable_func()
         except retryable_exceptions as e:
-            if attempt == max_retries:
-                logger.error(f"Retry failed after {max_retries} attempts: {e}")
+            if _is_context_overflow(e):
+                # The same prompt will never fit; let the caller shrink it
+                raise
+            if _is_client_error(e):
+                logger.error("Non-retryable exception: %s", e)
                 raise
-            wait = delay * (1 + random.random()) if jitter else delay
+            limit = max_retries
+            if limit is None:
+                limit = RATE_LIMIT_RETRIES if _is_rate_limited(e) else DEFAULT_RETRIES
+            if attempt >= limit:
+                logger.error("Retry failed after %d attempts: %s", limit, e)
+                raise
+            attempt += 1
+            # 5xx errors are usually brief blips: they back off exponentially
+            # too, but only up to a quarter of max_delay
+            status = _status_code(e)
+            server_error = isinstance(status, int) and status >= 500
+            cap = max_delay / 4 if server_error else max_delay
+            delay = min(cap, initial_delay * backoff_multiplier ** (attempt - 1))
+            wait = random.uniform(0, delay) if jitter else delay
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                wait = max(wait, retry_after)
             logger.warning(
-                f"{type(e).__name__} on attempt {attempt + 1}/{max_retries}: {e}. Retrying in {wait:.2f}s..."
+                "%s on attempt %d/%d: %s. Retrying in %.2fs...",
+                type(e).__name__,
+                attempt,
+                limit,
+                e,
+                wait,
             )
             time.sleep(wait)
-            delay *= backoff_multiplier
-            continue
+        except CircuitOpenError:
+            # Not an error in this call: the breaker warned once when it opened
+            raise
         except Exception as e:
-            logger.error(f"Non-retryable exception: {e}")
+            logger.error("Non-retryable exception: %s", e)
             raise
-    return None
+
+
+# Templates that only substitute these variables skip Jinja2 entirely
+_PLACEHOLDER_RE = re.compile(r"\{\{\s*(actor_line|tone|detail_level)\s*\}\}")
+
+
+class _SimpleTemplate:
+    """
+    Renders a template made of plain text and bare {{ var }} placeholders,
+    matching what jinja2.Template would produce for it.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    @classmethod
+    def parse(cls, source):
+        """_SimpleTemplate for source, or None if it needs Jinja2."""
+        # Like Jinja2, render every line ending as \n and drop a single
+        # trailing newline
+        source = source.replace("\r\n", "\n").replace("\r", "\n")
+        if source.endswith("\n"):
+            source = source[:-1]
+        parts = _PLACEHOLDER_RE.split(source)
+        for text in parts[::2]:
+            if "{{" in text or "{%" in text or "{#" in text or text.endswith("{"):
+                return None
+        return cls(parts)
+
+    def render(self, **context):
+        parts = list(self.parts)
+        parts[1::2] = [str(context.get(name, "")) for name in parts[1::2]]
+        return "".join(parts)
+
+
+class _SkeletonTemplate:
+    """
+    Jinja2 template that only ever outputs actor_line verbatim. It is
+    rendered once per tone/detail_level with a sentinel in place of the
+    actor line; each story is then a str.join of the resulting pieces.
+    """
+
+    _SENTINEL = "\x00actor_line\x00"
+
+    def __init__(self, template):
+        self.template = template
+        self.skeletons = {}
+
+    @classmethod
+    def wrap(cls, template, source):
+        """_SkeletonTemplate for template, or None if actor_line is not bare."""
+        from jinja2 import nodes
+
+        ast = template.environment.parse(source)
+        if any(ast.find_all(nodes.FilterBlock)):
+            return None
+        uses = [n for n in ast.find_all(nodes.Name) if n.name == "actor_line"]
+        bare = [
+            n
+            for output in ast.find_all(nodes.Output)
+            for n in output.nodes
+            if isinstance(n, nodes.Name) and n.name == "actor_line"
+        ]
+        return cls(template) if len(uses) == len(bare) else None
+
+    def render(self, actor_line="", **context):
+        skeletons = self.skeletons
+        if skeletons is None:
+            return self.template.render(actor_line=actor_line, **context)
+        key = tuple(sorted(context.items()))
+        parts = skeletons.get(key)
+        if parts is None:
+            skeleton = self.template.render(actor_line=self._SENTINEL, **context)
+            parts = skeleton.split(self._SENTINEL)
+            rendered = self.template.render(actor_line=actor_line, **context)
+            if actor_line.join(parts) != rendered:
+                # Something transformed the sentinel: always render in full
+                self.skeletons = None
+                return rendered
+            skeletons[key] = parts
+        return actor_line.join(parts)
+
+
+@functools.lru_cache(maxsize=32)
+def _load_template(path, mtime_ns):
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    simple = _SimpleTemplate.parse(source)
+    if simple is not None:
+        return simple
+
+    from jinja2 import Template
+
+    template = Template(source)
+    return _SkeletonTemplate.wrap(template, source) or template
+
+
+def _get_template(path):
+    """
+    Compiled template for path, parsed once per process. The file's
+    mtime is part of the cache key, so edits are still picked up.
+    """
+    return _load_template(path, os.stat(path).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=64)
+def _render_batch_header(path, mtime_ns, tone, detail_level):
+    return _load_template(path, mtime_ns).render(
+        actor_line="", tone=tone, detail_level=detail_level
+    )
+
+
+def _batch_header(path, tone, detail_level):
+    """
+    Template rendered without an actor line, used as the batch prompt
+    header. Rendered once per (template version, tone, detail_level).
+    """
+    return _render_batch_header(path, os.stat(path).st_mtime_ns, tone, detail_level)
+
+
+# Successful expansions for this process, keyed by everything that shapes
+# the prompt, so a story repeated across sections is only sent once
+_EXPANSIONS = {}
+
+
+def _expansion_key(actor_line, model, tone, detail_level, prompt_template_path):
+    template_key = None
+    if prompt_template_path:
+        try:
+            template_key = (
+                prompt_template_path,
+                os.stat(prompt_template_path).st_mtime_ns,
+            )
+        except OSError:
+            template_key = (prompt_template_path, None)
+    return (actor_line, model, tone, detail_level, template_key)
+
+
+# cache_file path -> {actor_line: body}; each file is read once per process
+_CACHES = {}
+_CACHE_LOCK = threading.Lock()
+# cache_file path -> lines in the file, live or superseded
+_CACHE_LINES = {}
+# Compact once superseded lines outnumber live entries, but not for tiny files
+_COMPACT_MIN_LINES = 64
+
+
+def _load_cache(path):
+    """
+    Return the in-memory cache for path, reading the file on first use.
+
+    The file is JSON Lines, one {key: body} object per line, so a new
+    entry is a single append. A legacy file holding one JSON object
+    is still accepted and is rewritten as JSON Lines, as is any file
+    not ending in a newline, which the next append would run into.
+    """
+    with _CACHE_LOCK:
+        if path in _CACHES:
+            return _CACHES[path]
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        except OSError as e:
+            logger.warning("Could not load cache: %s", e)
+            data = b""
+
+        try:
+            legacy = _loads(data) if data.strip() else None
+        except ValueError:
+            legacy = None
+        if isinstance(legacy, dict):
+            cache, lines = legacy, 1
+            if b"\n" in data.strip() or not data.endswith(b"\n"):
+                if _rewrite_cache(path, cache):
+                    lines = len(cache)
+        else:
+            cache, bad, lines = {}, 0, 0
+            for line in data.splitlines():
+                if not line.strip():
+                    continue
+                lines += 1
+                try:
+                    cache.update(_loads(line))
+                except (TypeError, ValueError):
+                    bad += 1
+            if bad:
+                logger.warning("Could not load %d cache entries from %s", bad, path)
+            if data and not data.endswith(b"\n") and _rewrite_cache(path, cache):
+                lines = len(cache)
+        _CACHES[path] = cache
+        _CACHE_LINES[path] = lines
+        return cache
+
+
+def _rewrite_cache(path, cache):
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.writelines(_dumps({k: v}) + b"\n" for k, v in cache.items())
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        logger.warning("Could not write cache: %s", e)
+        return False
+
+
+def _cache_key(model, prompt):
+    """
+    Content hash of everything sent to OpenAI for one story, so a changed
+    model, system prompt, rendered template or PROMPT_VERSION misses the
+    cache.
+    """
+    material = "\0".join((PROMPT_VERSION, model, _SYSTEM_MESSAGE["content"], prompt))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _cached_body(cache, actor_line, key):
+    body = cache.get(key)
+    if body is None:
+        # Entries written before keys were content hashes
+        body = cache.get(actor_line)
+    return body
+
+
+def _append_cache(path, key, value):
+    """
+    Record key in the cache for path with a single appended line. When
+    rewritten keys leave the file more than twice the size of the live
+    cache, it is compacted to one line per entry.
+    """
+    with _CACHE_LOCK:
+        cache = _CACHES.setdefault(path, {})
+        cache[key] = value
+        lines = _CACHE_LINES.get(path, 0) + 1
+        compact = lines > max(_COMPACT_MIN_LINES, 2 * len(cache))
+        if compact and _rewrite_cache(path, cache):
+            _CACHE_LINES[path] = len(cache)
+            return
+        _CACHE_LINES[path] = lines
+        try:
+            with open(path, "ab") as f:
+                f.write(_dumps({key: value}) + b"\n")
+        except OSError as e:
+            logger.warning("Could not write cache: %s", e)
+
+
+# Bump when the function schemas or the body formatting change, so cached
+# bodies generated the old way are not reused
+PROMPT_VERSION = "1"
+
+# Request payload pieces shared by every chat completion call
+_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are an expert product manager writing user stories.",
+}
+
+_STORY_PROPERTIES = {
+    "actor_line": {"type": "string"},
+    "description": {"type": "string"},
+    "acceptance_criteria": {"type": "array", "items": {"type": "string"}},
+}
+_STORY_REQUIRED = ["actor_line", "description", "acceptance_criteria"]
+
+_SINGLE_FN_SCHEMA = [
+    {
+        "name": "create_user_story",
+        "description": "Generate structured user story",
+        "parameters": {
+            "type": "object",
+            "properties": _STORY_PROPERTIES,
+            "required": _STORY_REQUIRED,
+        },
+    }
+]
+
+_BATCH_FN_SCHEMA = [
+    {
+        "name": "create_user_stories_batch",
+        "description": "Generate structured user stories in batch",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "stories": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": _STORY_PROPERTIES,
+                        "required": _STORY_REQUIRED,
+                    },
+                }
+            },
+            "required": ["stories"],
+        },
+    }
+]
+
+
+def _format_story(story):
+    """Render a structured story (actor_line, description, criteria) as markdown."""
+    criteria = "".join(f"- {crit}\n" for crit in story["acceptance_criteria"])
+    return (
+        f"{story['actor_line']}\n\n{story['description']}\n\n"
+        f"**Acceptance Criteria:**\n{criteria}"
+    )
+
+
+def _story_prompt(actor_line, tone, detail_level, prompt_template_path):
+    """User message for a single story: the rendered template, or the line."""
+    if not prompt_template_path:
+        return actor_line
+    try:
+        tpl = _get_template(prompt_template_path)
+        return tpl.render(actor_line=actor_line, tone=tone, detail_level=detail_level)
+    except ImportError:
+        logger.warning("jinja2 missing; using actor_line only")
+    except Exception as e:
+        logger.warning("Template error: %s; using actor_line only", e)
+    return actor_line
 
 
 def expand_story(
@@ -106,86 +818,45 @@ def expand_story(
     detail_level="medium",
     prompt_template_path=None,
     cache_file=None,
+    stream=False,
 ):
-    cache = {}
-    if cache_file and os.path.exists(cache_file):
-        try:
-            cache = json.loads(open(cache_file, "r", encoding="utf-8").read())
-        except Exception as e:
-            logger.warning(f"Could not load cache: {e}")
-        else:
-            if actor_line in cache:
-                return cache[actor_line]
-
-    user_content = actor_line
-    if prompt_template_path:
-        try:
-            from jinja2 import Template
-
-            tpl = Template(open(prompt_template_path, encoding="utf-8").read())
-            user_content = tpl.render(
-                actor_line=actor_line, tone=tone, detail_level=detail_level
-            )
-        except ImportError:
-            logger.warning("jinja2 missing; using actor_line only")
-        except Exception as e:
-            logger.warning(f"Template error: {e}; using actor_line only")
+    user_content = _story_prompt(actor_line, tone, detail_level, prompt_template_path)
+    if cache_file:
+        cache_key = _cache_key(model, user_content)
+        body = _cached_body(_load_cache(cache_file), actor_line, cache_key)
+        if body is not None:
+            return body
+    key = _expansion_key(actor_line, model, tone, detail_level, prompt_template_path)
+    if key in _EXPANSIONS:
+        return _EXPANSIONS[key]
 
     try:
-        resp = _retry(
-            lambda: openai.ChatCompletion.create(
+        msg = _retry(
+            lambda: _request_message(
+                stream,
                 model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert product manager writing user stories.",
-                    },
-                    {"role": "user", "content": user_content},
-                ],
-                functions=[
-                    {
-                        "name": "create_user_story",
-                        "description": "Generate structured user story",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "actor_line": {"type": "string"},
-                                "description": {"type": "string"},
-                                "acceptance_criteria": {
-                                    "type": "array",
-                                    "items": {"type": "string"},
-                                },
-                            },
-                            "required": [
-                                "actor_line",
-                                "description",
-                                "acceptance_criteria",
-                            ],
-                        },
-                    }
-                ],
+                messages=[_SYSTEM_MESSAGE, {"role": "user", "content": user_content}],
+                functions=_SINGLE_FN_SCHEMA,
                 function_call="auto",
             )
         )
-        msg = resp.choices[0].message
         if msg.get("function_call"):
-            data = json.loads(msg.function_call.arguments)
-            body = f"{data['actor_line']}\n\n{data['description']}\n\n**Acceptance Criteria:**\n"
-            for crit in data["acceptance_criteria"]:
-                body += f"- {crit}\n"
+            data = _loads(msg.function_call.arguments)
+            body = _format_story(data)
         else:
             text = (msg.content or "").strip()
             body = text if text.startswith(actor_line) else f"{actor_line}\n\n{text}"
     except Exception as e:
-        logger.error(f"expand_story API failed: {e}")
-        body = f"{actor_line}\n\n**Failed to expand story**"
+        if isinstance(e, CircuitOpenError):
+            logger.debug("expand_story skipped: %s", e)
+        else:
+            logger.error("expand_story API failed: %s", e)
+        # Not cached: a later call should try the API again
+        return f"{actor_line}\n\n**Failed to expand story**"
 
+    _EXPANSIONS[key] = body
     if cache_file:
-        try:
-            cache[actor_line] = body
-            open(cache_file, "w", encoding="utf-8").write(json.dumps(cache, indent=2))
-        except Exception as e:
-            logger.warning(f"Could not write cache: {e}")
+        _append_cache(cache_file, cache_key, body)
     return body
 
 
@@ -195,104 +866,539 @@ def expand_stories_batch(
     tone="neutral",
     detail_level="medium",
     prompt_template_path=None,
+    stream=False,
+    use_batch_api=False,
+    poll_interval=30,
+    cache_file=None,
+    chunk_size=None,
 ):
+    """
+    Expand actor lines with as few requests as possible. Lines are packed
+    into sub-batches of at most chunk_size lines (default 10) under a token
+    budget (GGI_BATCH_TOKENS) that run concurrently. A sub-batch rejected
+    as too long for the context window is split in half and retried; any
+    other failure falls back to per-story calls for that sub-batch only.
+
+    With use_batch_api, stories are instead submitted as one OpenAI Batch
+    job and polled every poll_interval seconds until it finishes (up to
+    24h). The job id is recorded in cache_file so an interrupted run picks
+    up the same job instead of submitting a new one.
+    """
     if not actor_lines:
         return {}
 
-    batch_text = "Generate complete user stories for:\n" + "\n".join(
-        f"- {a}" for a in actor_lines
+    keys = {
+        a: _expansion_key(a, model, tone, detail_level, prompt_template_path)
+        for a in actor_lines
+    }
+    out = {a: _EXPANSIONS[k] for a, k in keys.items() if k in _EXPANSIONS}
+    # keys holds each line once, so repeated lines are only requested once
+    actor_lines = [a for a in keys if a not in out]
+
+    if cache_file and actor_lines:
+        cache = _load_cache(cache_file)
+        cache_keys = {
+            a: _cache_key(
+                model, _story_prompt(a, tone, detail_level, prompt_template_path)
+            )
+            for a in actor_lines
+        }
+        for a in actor_lines:
+            body = _cached_body(cache, a, cache_keys[a])
+            if body is not None:
+                out[a] = body
+        actor_lines = [a for a in actor_lines if a not in out]
+    if not actor_lines:
+        return out
+
+    out.update(
+        _expand_pending(
+            actor_lines,
+            keys,
+            model,
+            tone,
+            detail_level,
+            prompt_template_path,
+            stream,
+            use_batch_api,
+            poll_interval,
+            cache_file,
+            chunk_size,
+        )
     )
-    user_content = batch_text
-    if prompt_template_path:
+    if cache_file:
+        # Only successful expansions are memoised; failures stay uncached
+        for a in actor_lines:
+            if keys[a] in _EXPANSIONS:
+                _append_cache(cache_file, cache_keys[a], out[a])
+    return out
+
+
+def _expand_pending(
+    actor_lines,
+    keys,
+    model,
+    tone,
+    detail_level,
+    prompt_template_path,
+    stream,
+    use_batch_api,
+    poll_interval,
+    cache_file,
+    chunk_size,
+):
+    """API work for expand_stories_batch once memo and cache hits are removed."""
+    if use_batch_api:
         try:
-            from jinja2 import Template
+            return _expand_with_batch_api(
+                actor_lines,
+                keys,
+                model,
+                tone,
+                detail_level,
+                prompt_template_path,
+                poll_interval,
+                cache_file,
+            )
+        except Exception as e:
+            logger.warning("Batch API failed (%s); using chat completions", e)
 
-            tpl = Template(open(prompt_template_path, encoding="utf-8").read())
-            header = tpl.render(actor_line="", tone=tone, detail_level=detail_level)
-            user_content = header + "\n\n" + batch_text
+    header = None
+    if prompt_template_path:
+        try:
+            header = _batch_header(prompt_template_path, tone, detail_level)
         except Exception as e:
-            logger.warning(f"Batch template error ({e}); continuing without template")
+            logger.warning("Batch template error (%s); continuing without template", e)
+
+    def expand(batch):
+        return _expand_sub_batch(
+            batch,
+            header,
+            keys,
+            model=model,
+            tone=tone,
+            detail_level=detail_level,
+            prompt_template_path=prompt_template_path,
+            stream=stream,
+        )
+
+    batches = _pack_batches(
+        actor_lines, model, _batch_token_budget(), chunk_size or DEFAULT_BATCH_SIZE
+    )
+    if len(batches) == 1:
+        return expand(batches[0])
+
+    out = {}
+    workers = max(1, min(_max_workers(), len(batches)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(expand, batches):
+            out.update(result)
+    return out
+
+
+def _batch_token_budget():
+    try:
+        return max(1, int(os.getenv("GGI_BATCH_TOKENS", DEFAULT_BATCH_TOKENS)))
+    except ValueError:
+        logger.warning("Invalid GGI_BATCH_TOKENS; using %d", DEFAULT_BATCH_TOKENS)
+        return DEFAULT_BATCH_TOKENS
+
+
+def _batch_max_wait():
+    try:
+        return max(0.0, float(os.getenv("GGI_BATCH_MAX_WAIT", DEFAULT_BATCH_MAX_WAIT)))
+    except ValueError:
+        logger.warning("Invalid GGI_BATCH_MAX_WAIT; using %d", DEFAULT_BATCH_MAX_WAIT)
+        return DEFAULT_BATCH_MAX_WAIT
+
+
+def _pack_batches(actor_lines, model, budget, max_items=None):
+    """
+    Greedily group actor lines so each group's estimated tokens fit budget
+    and no group holds more than max_items lines.
+    """
+    batches, current, used = [], [], 0
+    for a in actor_lines:
+        cost = _estimate_tokens(model, a) + 2  # "- " bullet and newline
+        full = max_items is not None and len(current) >= max_items
+        if current and (full or used + cost > budget):
+            batches.append(current)
+            current, used = [], 0
+        current.append(a)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _expand_sub_batch(
+    actor_lines,
+    header,
+    keys,
+    model,
+    tone,
+    detail_level,
+    prompt_template_path,
+    stream,
+):
+    """One batch request for actor_lines, falling back to per-story calls."""
+    if len(actor_lines) == 1:
+        # A single story needs neither the batch schema nor its bigger prompt
+        a = actor_lines[0]
+        return {
+            a: expand_story(
+                a,
+                model=model,
+                tone=tone,
+                detail_level=detail_level,
+                prompt_template_path=prompt_template_path,
+                stream=stream,
+            )
+        }
+
+    out = {}
+    user_content = "Generate complete user stories for:\n" + "\n".join(
+        f"- {a}" for a in actor_lines
+    )
+    if header is not None:
+        user_content = header + "\n\n" + user_content
 
     try:
-        resp = _retry(
-            lambda: openai.ChatCompletion.create(
+        msg = _retry(
+            lambda: _request_message(
+                stream,
                 model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert product manager writing user stories.",
-                    },
-                    {"role": "user", "content": user_content},
-                ],
-                functions=[
-                    {
-                        "name": "create_user_stories_batch",
-                        "description": "Generate structured user stories in batch",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "stories": {
-                                    "type": "array",
-                                    "items": {
-                                        "type": "object",
-                                        "properties": {
-                                            "actor_line": {"type": "string"},
-                                            "description": {"type": "string"},
-                                            "acceptance_criteria": {
-                                                "type": "array",
-                                                "items": {"type": "string"},
-                                            },
-                                        },
-                                        "required": [
-                                            "actor_line",
-                                            "description",
-                                            "acceptance_criteria",
-                                        ],
-                                    },
-                                }
-                            },
-                            "required": ["stories"],
-                        },
-                    }
-                ],
+                messages=[_SYSTEM_MESSAGE, {"role": "user", "content": user_content}],
+                functions=_BATCH_FN_SCHEMA,
                 function_call="auto",
             )
         )
-        msg = resp.choices[0].message
         if msg.get("function_call"):
+            arguments = msg.function_call.arguments
             try:
-                payload = json.loads(msg.function_call.arguments)
-                stories = payload.get("stories")
+                stories = _loads(arguments).get("stories")
                 if not isinstance(stories, list):
                     raise ValueError("Missing or invalid 'stories' key")
-                out = {}
-                for entry in stories:
-                    al = entry["actor_line"]
-                    body = (
-                        f"{al}\n\n{entry['description']}\n\n**Acceptance Criteria:**\n"
-                    )
-                    for crit in entry["acceptance_criteria"]:
-                        body += f"- {crit}\n"
-                    out[al] = body
-                return out
             except Exception as e:
+                stories = _salvage_stories(arguments)
                 logger.warning(
-                    f"Batch expand got unexpected payload: {e}; falling back to individual calls"
+                    "Batch expand got unexpected payload: %s; recovered %d of %d stories",
+                    e,
+                    len(stories),
+                    len(actor_lines),
                 )
+            for entry in stories:
+                try:
+                    al = entry["actor_line"]
+                    out[al] = _format_story(entry)
+                except (KeyError, TypeError):
+                    continue
+                if al in keys:
+                    _EXPANSIONS[keys[al]] = out[al]
+            # Only stories the response did not cover fall back below
+            actor_lines = [a for a in actor_lines if a not in out]
+            if not actor_lines:
+                return out
+            logger.warning(
+                "%d stories missing from batch response; falling back to individual calls",
+                len(actor_lines),
+            )
     except Exception as e:
-        logger.warning(f"Batch expand failed ({e}); falling back to individual calls")
+        if _is_context_overflow(e) and len(actor_lines) > 1:
+            half = len(actor_lines) // 2
+            logger.warning(
+                "Batch of %d stories exceeded the context window; retrying as two halves",
+                len(actor_lines),
+            )
+            out = {}
+            for part in (actor_lines[:half], actor_lines[half:]):
+                out.update(
+                    _expand_sub_batch(
+                        part,
+                        header,
+                        keys,
+                        model,
+                        tone,
+                        detail_level,
+                        prompt_template_path,
+                        stream,
+                    )
+                )
+            return out
+        logger.warning("Batch expand failed (%s); falling back to individual calls", e)
 
     # fallback to individual expansion
-    return {
-        a: expand_story(
-            a,
+    out.update(
+        _expand_stories_concurrently(
+            actor_lines,
             model=model,
             tone=tone,
             detail_level=detail_level,
             prompt_template_path=prompt_template_path,
+            stream=stream,
         )
-        for a in actor_lines
-    }
+    )
+    return out
+
+
+def _salvage_stories(arguments):
+    """
+    The complete story objects at the start of a truncated or otherwise
+    malformed batch payload, so only the rest need individual calls.
+    """
+    if not isinstance(arguments, str):
+        return []
+    key = arguments.find('"stories"')
+    start = arguments.find("[", key) if key >= 0 else -1
+    if start < 0:
+        return []
+    decoder = json.JSONDecoder()
+    stories, pos = [], start + 1
+    while True:
+        while pos < len(arguments) and arguments[pos] in " \t\r\n,":
+            pos += 1
+        try:
+            entry, pos = decoder.raw_decode(arguments, pos)
+        except ValueError:
+            return stories
+        if not isinstance(entry, dict):
+            return stories
+        stories.append(entry)
+
+
+def _is_context_overflow(exc):
+    """True if exc is OpenAI rejecting a prompt as too long for the model."""
+    if getattr(exc, "code", None) == "context_length_exceeded":
+        return True
+    message = str(exc)
+    return "context_length_exceeded" in message or "maximum context length" in message
+
+
+_BATCH_DONE = ("completed", "failed", "expired", "cancelled")
+
+_OPENAI_API_BASE = "https://api.openai.com/v1"
+
+
+def _openai_rest(method, path, **kwargs):
+    """
+    Parsed JSON (or raw bytes, for file content) of one OpenAI REST call,
+    made over the session installed by configure_http_session. The openai
+    0.x SDK has no Batch API, so its endpoints are called directly.
+
+    Rate limits and 5xx responses raise RateLimitError/APIError carrying
+    http_status and headers, so _retry handles them like SDK errors; other
+    4xx responses raise requests.HTTPError, which is not retried.
+    """
+    import requests
+
+    session = getattr(openai, "requestssession", None)
+    if not isinstance(session, requests.Session):
+        session = requests
+    base = getattr(openai, "api_base", None) or _OPENAI_API_BASE
+    response = session.request(
+        method,
+        base.rstrip("/") + path,
+        headers={"Authorization": f"Bearer {openai.api_key}"},
+        timeout=600,
+        **kwargs,
+    )
+    status = response.status_code
+    if status == 429 or status >= 500:
+        error = (RateLimitError if status == 429 else APIError)(
+            f"{status} from {path}: {response.text[:200]}"
+        )
+        error.http_status = status
+        error.headers = response.headers
+        raise error
+    response.raise_for_status()
+    if path.endswith("/content"):
+        return response.content
+    return _loads(response.content)
+
+
+def _expand_with_batch_api(
+    actor_lines,
+    keys,
+    model,
+    tone,
+    detail_level,
+    prompt_template_path,
+    poll_interval,
+    cache_file,
+):
+    """
+    Expand actor_lines through the OpenAI Batch API: one request per story
+    in an uploaded JSONL file. Stories missing from the output are expanded
+    with regular calls.
+
+    A job still running after GGI_BATCH_MAX_WAIT seconds raises, so the
+    caller falls back; its id stays in cache_file and a rerun resumes it.
+    A job that ended without completing is forgotten, so a rerun submits
+    a fresh one.
+    """
+    requests = [
+        {
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": [
+                    _SYSTEM_MESSAGE,
+                    {
+                        "role": "user",
+                        "content": _story_prompt(
+                            a, tone, detail_level, prompt_template_path
+                        ),
+                    },
+                ],
+                "functions": _SINGLE_FN_SCHEMA,
+                "function_call": "auto",
+            },
+        }
+        for i, a in enumerate(actor_lines)
+    ]
+    payload = b"".join(_dumps(r) + b"\n" for r in requests)
+    job_key = "batch-job:" + hashlib.sha256(payload).hexdigest()
+
+    job_id = _load_cache(cache_file).get(job_key) if cache_file else None
+    if job_id:
+        logger.info("Resuming OpenAI batch %s", job_id)
+        job = _retry(lambda: _openai_rest("GET", f"/batches/{job_id}"))
+    else:
+        upload = _retry(
+            lambda: _openai_rest(
+                "POST",
+                "/files",
+                data={"purpose": "batch"},
+                files={"file": ("stories.jsonl", payload, "application/jsonl")},
+            )
+        )
+        job = _retry(
+            lambda: _openai_rest(
+                "POST",
+                "/batches",
+                json={
+                    "input_file_id": upload["id"],
+                    "endpoint": "/v1/chat/completions",
+                    "completion_window": "24h",
+                },
+            )
+        )
+        if cache_file:
+            _append_cache(cache_file, job_key, job["id"])
+        logger.info(
+            "Submitted OpenAI batch %s with %d stories", job["id"], len(requests)
+        )
+
+    deadline = time.monotonic() + _batch_max_wait()
+    while job["status"] not in _BATCH_DONE:
+        if time.monotonic() >= deadline:
+            raise RuntimeError(
+                f"batch {job['id']} still {job['status']}; rerun to resume it"
+            )
+        time.sleep(poll_interval)
+        job = _retry(lambda: _openai_rest("GET", f"/batches/{job['id']}"))
+    if job["status"] != "completed" or not job.get("output_file_id"):
+        if cache_file:
+            # Tombstone: the next run must not resume this dead job
+            _append_cache(cache_file, job_key, None)
+        raise RuntimeError(f"batch {job['id']} ended with status {job['status']}")
+
+    out = {}
+    output = _retry(
+        lambda: _openai_rest("GET", f"/files/{job['output_file_id']}/content")
+    )
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            result = _loads(line)
+            a = actor_lines[int(result["custom_id"])]
+            message = result["response"]["body"]["choices"][0]["message"]
+            out[a] = _format_story(_loads(message["function_call"]["arguments"]))
+        except Exception as e:
+            logger.warning("Skipping unusable batch result: %s", e)
+            continue
+        _EXPANSIONS[keys[a]] = out[a]
+
+    missing = [a for a in actor_lines if a not in out]
+    if missing:
+        logger.warning(
+            "%d stories missing from batch output; expanding individually", len(missing)
+        )
+        out.update(
+            _expand_stories_concurrently(
+                missing,
+                model=model,
+                tone=tone,
+                detail_level=detail_level,
+                prompt_template_path=prompt_template_path,
+            )
+        )
+    return out
+
+
+def _expand_stories_concurrently(actor_lines, max_workers=None, **kwargs):
+    """
+    Expand each actor line with its own expand_story call, overlapping the
+    OpenAI round-trips on a bounded thread pool. expand_story never raises,
+    so one failing story cannot block the others.
+    """
+    workers = max(1, min(max_workers or _max_workers(), len(actor_lines)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        bodies = pool.map(lambda a: expand_story(a, **kwargs), actor_lines)
+        return dict(zip(actor_lines, bodies))
+
+
+# Held while the milestone index is listed or a milestone is created
+_MILESTONE_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _milestone_index(repo):
+    """
+    Title -> milestone for every open or closed milestone in repo. Listed
+    once and reused for every section whose milestone already exists.
+    """
+    return _retry(lambda: {m.title: m for m in repo.get_milestones(state="all")})
+
+
+def _find_or_create_milestone(repo, title):
+    """
+    The milestone called title, looked up in the cached index first so a
+    rerun does not attempt (and fail) to create existing milestones.
+    Returns None if it can neither be found nor created.
+    """
+    # Lookup, create and insert under one lock: two sections with the same
+    # title must not both miss the index and POST the milestone twice
+    with _MILESTONE_LOCK:
+        try:
+            index = _milestone_index(repo)
+        except Exception as e:
+            logger.warning("Failed to fetch milestones: %s", e)
+            index = {}
+        milestone = index.get(title)
+        if milestone is not None:
+            return milestone
+
+        try:
+            milestone = _retry(
+                lambda: _github_write(repo.create_milestone, title=title)
+            )
+        except GithubException:
+            # Created elsewhere since the index was listed: list again
+            _milestone_index.cache_clear()
+            try:
+                milestone = _milestone_index(repo).get(title)
+            except Exception as ge:
+                logger.error("Failed to fetch milestones: %s", ge)
+                return None
+            if not milestone:
+                logger.error("Can't find or create milestone '%s'", title)
+            return milestone
+        index[title] = milestone
+        return milestone
 
 
 def create_milestone_and_issues(
@@ -304,41 +1410,209 @@ def create_milestone_and_issues(
     detail_level="medium",
     prompt_template_path=None,
     cache_file=None,
+    max_workers=None,
+    stream=False,
+    use_batch_api=False,
 ):
-    epic = section["title"]
-    try:
-        milestone = _retry(lambda: repo.create_milestone(title=epic))
-    except GithubException:
-        try:
-            all_ms = _retry(lambda: repo.get_milestones())
-        except Exception as ge:
-            logger.error(f"Failed to fetch milestones: {ge}")
-            return
-        milestone = next((m for m in all_ms if m.title == epic), None)
-        if not milestone:
-            logger.error(f"Can't find or create milestone '{epic}'")
-            return
-
-    new_lines = [a for a in section["stories"] if a not in existing_actor_lines]
-    if not new_lines:
-        return
+    """
+    Create the section's milestone (or reuse an existing one) and one issue
+    per story not already in existing_actor_lines. Stories are compared
+    with normalize_actor_line, so case and surrounding whitespace do not
+    make a story new.
 
-    bodies = expand_stories_batch(
+    existing_actor_lines is updated in place with every story whose issue
+    was created. Pass a mutable set to share it across calls; created
+    stories are appended to a list, while any other iterable (e.g. a
+    frozenset) is only read.
+    """
+    new_lines = _claim_new_lines(
+        section["stories"], {normalize_actor_line(a) for a in existing_actor_lines}
+    )
+    created = _created_lines(existing_actor_lines)
+    _create_section(
+        repo,
+        section["title"],
         new_lines,
-        model=model,
+        model,
+        created,
+        threading.Lock(),
+        max_workers=max_workers,
         tone=tone,
         detail_level=detail_level,
         prompt_template_path=prompt_template_path,
+        cache_file=cache_file,
+        stream=stream,
+        use_batch_api=use_batch_api,
+    )
+    if isinstance(existing_actor_lines, list):
+        existing_actor_lines.extend(a for a in new_lines if a in created)
+
+
+def _claim_new_lines(actor_lines, claimed):
+    """
+    The actor lines whose normalized form is not in claimed, in order,
+    adding each to claimed so repeats are dropped as well.
+    """
+    new_lines = []
+    for actor_line in actor_lines:
+        key = normalize_actor_line(actor_line)
+        if key not in claimed:
+            claimed.add(key)
+            new_lines.append(actor_line)
+    return new_lines
+
+
+def _created_lines(existing_actor_lines):
+    """
+    The set created stories are added to: existing_actor_lines itself when
+    it is a mutable set, else a new empty set rather than a copy of it.
+    """
+    if isinstance(existing_actor_lines, MutableSet):
+        return existing_actor_lines
+    return set()
+
+
+def _create_section(
+    repo,
+    epic,
+    new_lines,
+    model,
+    created,
+    lock,
+    max_workers=None,
+    bodies=None,
+    **expand_kwargs,
+):
+    """
+    Find or create the epic's milestone, then expand new_lines (already
+    de-duplicated) unless their bodies are given, and create their issues.
+    Each created story is added to created while holding lock, which
+    sections running at the same time share.
+    """
+    milestone = _find_or_create_milestone(repo, epic)
+    if milestone is None or not new_lines:
+        return
+
+    if bodies is None:
+        bodies = expand_stories_batch(new_lines, model=model, **expand_kwargs)
+    _create_issues_concurrently(
+        repo, new_lines, bodies, milestone, created, lock, max_workers
     )
 
-    for al in new_lines:
+
+# create_milestone_and_issues keyword arguments that shape story expansion
+_EXPAND_KWARGS = (
+    "tone",
+    "detail_level",
+    "prompt_template_path",
+    "cache_file",
+    "stream",
+    "use_batch_api",
+)
+
+
+def create_all_milestones_and_issues(
+    repo, sections, model, existing_actor_lines, max_sections=None, **kwargs
+):
+    """
+    Create the milestone and issues of every section, several sections at
+    a time (GGI_SECTIONS, default 4). A story listed under more than one
+    section is only created in the first, and existing_actor_lines is
+    updated with the same in-place contract as create_milestone_and_issues.
+    Extra keyword arguments are those of create_milestone_and_issues.
+
+    existing_actor_lines is normalized once, here; sections only see the
+    stories left to create, so none of them reads the shared set. The new
+    stories of all sections are expanded together first, so small
+    sections share batch requests (and a single Batch API job) instead of
+    sending one each; the sections then reuse the expanded bodies.
+    """
+    if not sections:
+        return
+    created = _created_lines(existing_actor_lines)
+    lock = threading.Lock()
+
+    # Claim stories in document order up front; sections then run independently
+    claimed = {normalize_actor_line(a) for a in existing_actor_lines}
+    planned = [
+        (section["title"], _claim_new_lines(section["stories"], claimed))
+        for section in sections
+    ]
+
+    # Every section takes its bodies from this one expansion, so a failed
+    # story is not retried (or resubmitted as a Batch API job) per section
+    expand_kwargs = {k: v for k, v in kwargs.items() if k in _EXPAND_KWARGS}
+    all_stories = [a for _, new_lines in planned for a in new_lines]
+    bodies = {}
+    if all_stories:
+        bodies = expand_stories_batch(all_stories, model=model, **expand_kwargs)
+
+    workers = max(1, min(max_sections or _section_workers(), len(planned)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _create_section,
+                repo,
+                epic,
+                new_lines,
+                model,
+                created,
+                lock,
+                max_workers=kwargs.get("max_workers"),
+                bodies=bodies,
+            )
+            for epic, new_lines in planned
+        ]
+        for future in futures:
+            future.result()
+    if isinstance(existing_actor_lines, list):
+        existing_actor_lines.extend(a for a in all_stories if a in created)
+
+
+def _section_workers():
+    try:
+        return max(1, int(os.getenv("GGI_SECTIONS", DEFAULT_SECTION_WORKERS)))
+    except ValueError:
+        logger.warning("Invalid GGI_SECTIONS; using %d", DEFAULT_SECTION_WORKERS)
+        return DEFAULT_SECTION_WORKERS
+
+
+_TITLE_LIMIT = 50
+
+
+def _truncate(s, n=_TITLE_LIMIT, ell="..."):
+    """Shorten s to at most n characters, ending in ell when cut."""
+    return s if len(s) <= n else s[: n - len(ell)] + ell
+
+
+def _create_issues_concurrently(
+    repo, new_lines, bodies, milestone, created, lock, max_workers
+):
+    """
+    Create one issue per actor line, overlapping the GitHub round-trips on
+    a bounded thread pool. created is only updated from the calling
+    thread, under lock, as results complete.
+    """
+
+    def create(al):
         body = bodies.get(al, f"{al}\n\n**Failed to expand story**")
-        title = al if len(al) <= 50 else al[:47] + "..."
-        try:
-            issue = _retry(
-                lambda: repo.create_issue(title=title, body=body, milestone=milestone)
+        title = _truncate(al)
+        return _retry(
+            lambda: _github_write(
+                repo.create_issue, title=title, body=body, milestone=milestone
             )
-            existing_actor_lines.add(al)
-            logger.info(f"Created issue #{issue.number} for '{al}'")
-        except GithubException as e:
-            logger.error(f"Issue creation failed for '{al}': {e}")
+        )
+
+    workers = max(1, min(max_workers or _max_workers(), len(new_lines)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(create, al): al for al in new_lines}
+        for future in as_completed(futures):
+            al = futures[future]
+            try:
+                issue = future.result()
+            except GithubException as e:
+                logger.error("Issue creation failed for '%s': %s", al, e)
+                continue
+            with lock:
+                created.add(al)
+            logger.info("Created issue #%s for '%s'", issue.number, al)
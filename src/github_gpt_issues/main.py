@@ -3,41 +3,150 @@
 """
 CLI for github-gpt-issues, now supporting batching and rate-limit retry.
 """
+
 import os
 import sys
 import argparse
+import hashlib
+import json
 import logging
 import re
-import openai
-from github import Github, GithubException
-# fmt: off
-from github_gpt_issues.core import (
-    parse_markdown,
-    create_milestone_and_issues
-)
-# fmt: on
+import time
 
+# Run as a script (python src/github_gpt_issues/main.py), only this file's
+# directory is on sys.path; add src/ so the package itself is importable
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+# openai, github and core are imported where needed so that --help and
+# --run-tests do not pay for loading their HTTP stacks
+from github_gpt_issues._parse import normalize_actor_line, parse_markdown  # noqa: E402
+
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
-def load_existing_actor_lines(repo):
-    pattern = re.compile(r"^(As an? .+)$", re.MULTILINE)
-    existing = set()
+# First actor line in an issue body created by this tool
+_ACTOR_RE = re.compile(r"^(As an? .+)$", re.MULTILINE)
+
+# The search API never returns more than this many results for a query
+_SEARCH_LIMIT = 1000
+
+
+def _search_story_issues(gh, repo):
+    """
+    Issues in repo whose body mentions an actor line, found with one
+    search query instead of listing every issue. None when the search
+    fails or hits the result limit, so callers fall back to a full scan.
+    """
+    from github import GithubException
+
+    query = f'repo:{repo.full_name} is:issue in:body "As a" OR "As an"'
     try:
+        results = gh.search_issues(query)
+        if results.totalCount >= _SEARCH_LIMIT:
+            logger.info("Too many matching issues for search; scanning all issues")
+            return None
+        return results
+    except GithubException as e:
+        logger.warning("Issue search failed (%s); scanning all issues", e)
+        return None
+
+
+_NEXT_LINK_RE = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+def _iter_issue_bodies(repo):
+    """
+    Body of every issue in repo, read straight from the REST API 100 per
+    page instead of hydrating an Issue object per result, each page retried
+    on rate limits and server errors. Falls back to repo.get_issues for
+    repository objects without a PyGithub requester.
+    """
+    from github import GithubException
+    from github_gpt_issues.core import _loads, _retry
+
+    def fetch(url, parameters):
+        status, headers, data = requester.requestJson("GET", url, parameters)
+        if status != 200:
+            raise GithubException(status, data, headers)
+        return headers, data
+
+    requester = getattr(repo, "_requester", None)
+    if requester is None:
         for issue in repo.get_issues(state="all"):
-            raw_body = getattr(issue, "body", "") or ""
+            yield getattr(issue, "body", "")
+        return
+
+    url = f"{repo.url}/issues"
+    parameters = {"state": "all", "per_page": 100}
+    while url:
+        # Rate limits and 5xx responses are retried per page, not per listing
+        headers, data = _retry(fetch, url, parameters)
+        for issue in _loads(data):
+            yield issue.get("body")
+        link = _NEXT_LINK_RE.search(headers.get("link", ""))
+        url, parameters = (link.group(1), None) if link else (None, None)
+
+
+def load_existing_actor_lines(repo, gh=None):
+    import requests
+    from github import GithubException
+
+    existing = set()
+    try:
+        issues = _search_story_issues(gh, repo) if gh is not None else None
+        if issues is None:
+            bodies = _iter_issue_bodies(repo)
+        else:
+            bodies = (getattr(issue, "body", "") for issue in issues)
+        for raw_body in bodies:
             # Remove leading/trailing whitespace so our regex can match cleanly
-            body = raw_body.strip()
-            m = pattern.search(body)
+            body = (raw_body or "").strip()
+            m = _ACTOR_RE.search(body)
             if m:
                 existing.add(m.group(1).strip())
-    except Exception as e:
-        logger.warning(f"Failed to load existing issues: {e}")
+    except (GithubException, requests.RequestException, ValueError) as e:
+        # ValueError: a page that is not valid JSON (e.g. truncated)
+        logger.warning("Failed to load existing issues: %s", e)
     return existing
 
 
+# CLI flags that override the GGI_* environment settings read by core
+_LIMIT_FLAGS = (
+    ("concurrency", "GGI_CONCURRENCY"),
+    ("rpm", "GGI_RPM"),
+    ("tpm", "GGI_TPM"),
+)
+
+
+def apply_limit_args(args):
+    for flag, env_var in _LIMIT_FLAGS:
+        value = getattr(args, flag, None)
+        if value is not None:
+            os.environ[env_var] = str(value)
+
+
+def load_state(path):
+    """State recorded by the last complete run, or {} if there is none."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable state file %s: %s", path, e)
+        return {}
+
+
+def save_state(path, state):
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Could not write state file %s: %s", path, e)
+
+
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--markdown", required=True)
@@ -47,41 +156,102 @@ def main():
     p.add_argument("--tone", default="neutral")
     p.add_argument("--detail-level", default="medium")
     p.add_argument("--cache-file")
+    p.add_argument(
+        "--state-file",
+        help="Skip the run when the markdown is unchanged since the last complete run",
+    )
+    p.add_argument(
+        "--force", action="store_true", help="Run even if --state-file matches"
+    )
+    p.add_argument("--stream", action="store_true")
+    p.add_argument(
+        "--search-existing",
+        action="store_true",
+        help="Find existing stories with the issue search API instead of listing all issues",
+    )
+    p.add_argument(
+        "--batch-api",
+        action="store_true",
+        help="Submit stories as an OpenAI Batch job (cheaper, up to 24h)",
+    )
+    p.add_argument("--concurrency", type=int, help="Max simultaneous API requests")
+    p.add_argument("--rpm", type=int, help="OpenAI requests per minute")
+    p.add_argument("--tpm", type=int, help="OpenAI prompt tokens per minute")
     p.add_argument("--run-tests", action="store_true")
     args = p.parse_args()
+    apply_limit_args(args)
 
     if args.run_tests:
         import pytest
 
         sys.exit(pytest.main(["--maxfail=1", "--disable-warnings", "--cov=src"]))
 
+    with open(args.markdown, "rb") as f:
+        md_bytes = f.read()
+    md_hash = hashlib.sha256(md_bytes).hexdigest()
+    if args.state_file and not args.force:
+        state = load_state(args.state_file)
+        if state.get("markdown_hash") == md_hash and state.get("repo") == args.repo:
+            logger.info(
+                "Markdown unchanged since the last complete run; use --force to rerun"
+            )
+            return
+
+    import openai
+    import requests
+    from github import Github, GithubException
+    from github_gpt_issues.core import (
+        _connection_pool_size,
+        configure_http_session,
+        create_all_milestones_and_issues,
+    )
+
     gh_token = os.getenv("GITHUB_TOKEN")
     openai_key = os.getenv("OPENAI_API_KEY")
     if not (gh_token and openai_key):
         logger.error("Set GITHUB_TOKEN & OPENAI_API_KEY")
         sys.exit(1)
     openai.api_key = openai_key
+    configure_http_session()
 
     try:
-        repo = Github(gh_token).get_repo(args.repo)
-    except Exception as e:
-        logger.error(f"GitHub access error: {e}")
+        # Largest page size, and a keep-alive connection per concurrent call
+        gh = Github(gh_token, per_page=100, pool_size=_connection_pool_size())
+        repo = gh.get_repo(args.repo)
+    except (GithubException, requests.RequestException) as e:
+        logger.error("GitHub access error: %s", e)
         sys.exit(1)
 
-    existing = load_existing_actor_lines(repo)
-    md = open(args.markdown, encoding="utf-8").read()
-    sections = parse_markdown(md)
-    for sec in sections:
-        create_milestone_and_issues(
-            repo,
-            sec,
-            args.model,
-            existing,
-            tone=args.tone,
-            detail_level=args.detail_level,
-            prompt_template_path=args.prompt_template,
-            cache_file=args.cache_file,
-        )
+    existing = load_existing_actor_lines(repo, gh if args.search_existing else None)
+    sections = parse_markdown(md_bytes.decode("utf-8"))
+    create_all_milestones_and_issues(
+        repo,
+        sections,
+        args.model,
+        existing,
+        tone=args.tone,
+        detail_level=args.detail_level,
+        prompt_template_path=args.prompt_template,
+        cache_file=args.cache_file,
+        stream=args.stream,
+        use_batch_api=args.batch_api,
+    )
+
+    if args.state_file:
+        created = {normalize_actor_line(a) for a in existing}
+        missing = [
+            a
+            for sec in sections
+            for a in sec["stories"]
+            if normalize_actor_line(a) not in created
+        ]
+        if missing:
+            logger.warning("%d stories were not created; state not saved", len(missing))
+        else:
+            save_state(
+                args.state_file,
+                {"markdown_hash": md_hash, "repo": args.repo, "last_run": time.time()},
+            )
 
 
 if __name__ == "__main__":
@@ -21,7 +21,8 @@ if SRC_PATH not in sys.path:
 
 import pytest  # noqa: E402
 import json  # noqa: E402
-from types import SimpleNamespace  # noqa: E402
+from functools import lru_cache  # noqa: E402
+from collections import namedtuple  # noqa: E402
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Dummy classes to simulate OpenAI function responses
@@ -52,33 +53,169 @@ class DummyResponse:
         self.choices = [choice]
 
 
+def log_contains(caplog, text):
+    """True if any captured log message contains text"""
+    return text in "\n".join(r.getMessage() for r in caplog.records)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Dummy GitHub objects shared by the milestone/issue and main.py tests
+# ──────────────────────────────────────────────────────────────────────────────
+DummyMilestone = namedtuple("DummyMilestone", ["title"])
+DummyIssue = namedtuple(
+    "DummyIssue", ["number", "title", "body", "milestone"], defaults=(None,) * 4
+)
+
+
+class DummyRepo:
+    """Records created milestones (unique by title) and issues"""
+
+    def __init__(self, issues=()):
+        self._by_title = {}
+        self.issues = list(issues)
+
+    @property
+    def milestones(self):
+        return list(self._by_title.values())
+
+    @milestones.setter
+    def milestones(self, milestones):
+        self._by_title = {m.title: m for m in milestones}
+
+    def create_milestone(self, title):
+        from github import GithubException
+
+        # Like GitHub, milestone titles are unique within a repository
+        if title in self._by_title:
+            raise GithubException(422, "already_exists", None)
+        m = self._by_title[title] = DummyMilestone(title)
+        return m
+
+    def get_milestones(self, state="open"):
+        return self.milestones
+
+    def get_issues(self, state="open"):
+        return iter(self.issues)
+
+    def create_issue(self, title, body, milestone):
+        issue = DummyIssue(len(self.issues) + 1, title, body, milestone)
+        self.issues.append(issue)
+        return issue
+
+
+class StreamingDummyRepo:
+    """Generates count issues on demand instead of holding them in memory"""
+
+    def __init__(self, count, distinct=100):
+        self.count = count
+        self.distinct = distinct
+
+    def get_issues(self, state="open"):
+        for n in range(self.count):
+            yield DummyIssue(n + 1, body=f"As a user, want X{n % self.distinct}\nNotes")
+
+
+class BadRepo:
+    """Repository whose issue listing always fails"""
+
+    def get_issues(self, state="open"):
+        from github import GithubException
+
+        raise GithubException(502, "Bad Gateway", None)
+
+
+@pytest.fixture
+def dummy_repo():
+    return DummyRepo()
+
+
+@lru_cache(maxsize=None)
+def _repo_for(bodies):
+    return DummyRepo(DummyIssue(body=body) for body in bodies)
+
+
+@pytest.fixture(scope="session")
+def make_repo():
+    """
+    Factory for a repository holding one issue per given body. Repositories
+    are shared between calls with the same bodies, so only read from them.
+    """
+
+    def make(*bodies):
+        return _repo_for(bodies)
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def empty_repo():
+    return DummyRepo()
+
+
+@pytest.fixture(scope="session")
+def bad_repo():
+    return BadRepo()
+
+
+@pytest.fixture(scope="session")
+def prompt_template(tmp_path_factory):
+    """Path of a Jinja prompt template shared by the whole session"""
+    tpl = tmp_path_factory.mktemp("tpl") / "prompt.md"
+    tpl.write_text(
+        "Generate a story for {{ actor_line }} with tone={{ tone }} and detail={{ detail_level }}"
+    )
+    return str(tpl)
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Global fixture to patch openai.ChatCompletion.create
 # ──────────────────────────────────────────────────────────────────────────────
-@pytest.fixture(autouse=True)
-def patch_openai(monkeypatch):
+@lru_cache(maxsize=None)
+def _canned_response(actor_line):
+    payload = {
+        "actor_line": actor_line,
+        "description": "This is a description.",
+        "acceptance_criteria": ["First criterion", "Second criterion"],
+    }
+    func_call = DummyFunctionCall(arguments=json.dumps(payload))
+    return DummyResponse(DummyChoice(DummyMessage(function_call=func_call)))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def patch_openai():
     """
-    Automatically patch openai.ChatCompletion.create for all tests.
-    Returns a structured payload by default.
+    Patch openai.ChatCompletion.create once for the whole session.
+    Returns a structured payload, built once per actor line; tests that
+    monkeypatch create themselves get this fake back on teardown.
     """
     import github_gpt_issues.core as core_module
 
     def fake_create(*args, **kwargs):
-        # Grab the last user message as actor_line
-        messages = kwargs.get("messages", [])
-        actor_line = ""
-        for msg in reversed(messages):
-            if msg.get("role") == "user":
-                actor_line = msg.get("content", "")
-                break
-
-        payload = {
-            "actor_line": actor_line,
-            "description": "This is a description.",
-            "acceptance_criteria": ["First criterion", "Second criterion"],
-        }
-        func_call = DummyFunctionCall(arguments=json.dumps(payload))
-        message = DummyMessage(function_call=func_call)
-        return DummyResponse(DummyChoice(message))
-
-    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", fake_create)
+        # core always sends [system, user]: the user message is the actor_line
+        return _canned_response(kwargs["messages"][-1]["content"])
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(core_module.openai.ChatCompletion, "create", fake_create)
+        yield
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Process-wide caches in core must not leak results between tests
+# ──────────────────────────────────────────────────────────────────────────────
+@pytest.fixture(autouse=True)
+def reset_core_caches():
+    import github_gpt_issues.core as core_module
+
+    core_module._EXPANSIONS.clear()
+    core_module._milestone_index.cache_clear()
+    core_module._render_batch_header.cache_clear()
+    core_module._OPENAI_BREAKER.reset()
+    core_module._openai_slots.cache_clear()
+    core_module._github_slots.cache_clear()
+    yield
+    core_module._EXPANSIONS.clear()
+    core_module._milestone_index.cache_clear()
+    core_module._render_batch_header.cache_clear()
+    core_module._OPENAI_BREAKER.reset()
+    core_module._openai_slots.cache_clear()
+    core_module._github_slots.cache_clear()
@@ -1,12 +1,14 @@
 import pytest
 import json
 import openai
+import requests
 from github_gpt_issues.core import (
     _retry,
     RateLimitError,
     APIError,
     expand_stories_batch,
 )
+from tests.conftest import log_contains
 
 
 # Dummy function to simulate API errors and successes
@@ -50,13 +52,10 @@ class DummyResponse:
 @pytest.fixture(autouse=True)
 def patch_openai_batch(monkeypatch):
     """Patch openai.ChatCompletion.create for batch tests"""
-    import github_gpt_issues.core as core_module
 
     def fake_batch_create(*args, **kwargs):
         # Validate batch prompt
-        messages = kwargs.get("messages", [])
-        user_msg = next((m for m in messages if m["role"] == "user"), {})
-        assert "- A1\n- A2" in user_msg.get("content", "")
+        assert "- A1\n- A2" in kwargs["messages"][-1]["content"]
 
         # Simulate structured batch function_call
         payload = {
@@ -185,7 +184,7 @@ def test_expand_stories_batch_malformed_json(monkeypatch, caplog):
         lambda actor_line, **kwargs: f"story_for_{actor_line}",
     )
 
-    caplog.set_level("WARNING")
+    caplog.set_level("WARNING", logger="github_gpt_issues.core")
     result = core_module.expand_stories_batch(["X1", "X2"], model="gpt-test")
 
     # We should have fallen back to expand_story for each actor_line
@@ -195,7 +194,7 @@ def test_expand_stories_batch_malformed_json(monkeypatch, caplog):
     }
 
     # And a warning was logged about the batch failure
-    assert any("Batch expand failed" in rec.message for rec in caplog.records)
+    assert log_contains(caplog, "Batch expand failed")
 
 
 def test_expand_stories_batch_raw_content_fallback(monkeypatch):
@@ -228,3 +227,468 @@ def test_expand_stories_batch_raw_content_fallback(monkeypatch):
 
     # 4) Since raw_content doesn’t split into per-story blocks, we should see fall-back
     assert result == {"X1": "story_X1", "X2": "story_X2"}
+
+
+def test_expand_stories_batch_fallback_runs_concurrently(monkeypatch):
+    """Fallback expansions overlap instead of running one after another"""
+    import threading
+    import github_gpt_issues.core as core_module
+
+    monkeypatch.setenv("GGI_CONCURRENCY", "3")
+    monkeypatch.setattr(
+        openai.ChatCompletion,
+        "create",
+        lambda *a, **k: (_ for _ in ()).throw(openai.error.RateLimitError()),
+    )
+    # Each stub blocks until all three are in flight; serial execution would time out
+    barrier = threading.Barrier(3, timeout=5)
+
+    def blocking_expand(actor_line, **kwargs):
+        barrier.wait()
+        return f"story_{actor_line}"
+
+    monkeypatch.setattr(core_module, "expand_story", blocking_expand)
+
+    result = expand_stories_batch(["X1", "X2", "X3"], model="gpt-test")
+    assert result == {"X1": "story_X1", "X2": "story_X2", "X3": "story_X3"}
+
+
+def _stream_chunks(arguments, size=7):
+    """Split a function_call payload into openai-style streamed deltas"""
+    from types import SimpleNamespace
+
+    pieces = [arguments[i:][:size] for i in range(0, len(arguments), size)]
+    deltas = [{"function_call": {"name": "create_user_stories_batch", "arguments": ""}}]
+    deltas += [{"function_call": {"arguments": p}} for p in pieces]
+    return [SimpleNamespace(choices=[SimpleNamespace(delta=d)]) for d in deltas]
+
+
+def test_expand_stories_batch_streaming(monkeypatch):
+    payload = {
+        "stories": [
+            {"actor_line": "A1", "description": "Desc1", "acceptance_criteria": ["C1"]},
+            {"actor_line": "A2", "description": "Desc2", "acceptance_criteria": ["C2"]},
+        ]
+    }
+    requests = []
+
+    def fake_stream_create(**kwargs):
+        requests.append(kwargs)
+        return iter(_stream_chunks(json.dumps(payload)))
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", fake_stream_create)
+
+    result = expand_stories_batch(["A1", "A2"], model="gpt-test", stream=True)
+
+    assert requests[0]["stream"] is True
+    assert result["A1"].startswith("A1") and "Desc1" in result["A1"]
+    assert result["A2"].startswith("A2") and "Desc2" in result["A2"]
+
+
+def test_collect_stream_plain_content():
+    from types import SimpleNamespace
+    from github_gpt_issues.core import _collect_stream
+
+    chunks = [
+        SimpleNamespace(choices=[SimpleNamespace(delta={"role": "assistant"})]),
+        SimpleNamespace(choices=[SimpleNamespace(delta={"content": "Hello "})]),
+        SimpleNamespace(choices=[SimpleNamespace(delta={"content": "world"})]),
+        SimpleNamespace(choices=[]),
+    ]
+    msg = _collect_stream(chunks)
+    assert msg.content == "Hello world"
+    assert msg.get("function_call") is None
+
+
+def test_expand_stories_batch_splits_under_token_budget(monkeypatch):
+    """Sub-batches are sent separately and only the failing one falls back"""
+    import re
+    import github_gpt_issues.core as core_module
+
+    lines = [f"As user {i}, I want feature number {i}" for i in range(6)]
+    prompts = []
+
+    def fake_create(**kwargs):
+        content = kwargs["messages"][-1]["content"]
+        prompts.append(content)
+        if kwargs["functions"][0]["name"] == "create_user_story":
+            payload = {
+                "actor_line": content,
+                "description": "single",
+                "acceptance_criteria": [],
+            }
+            message = DummyMessage(function_call=DummyFunctionCall(json.dumps(payload)))
+            return DummyResponse(DummyChoice(message))
+        requested = re.findall(r"^- (.+)$", content, re.M)
+        if lines[0] in requested:
+            raise APIError("context length exceeded")
+        stories = [
+            {"actor_line": a, "description": "batched", "acceptance_criteria": []}
+            for a in requested
+        ]
+        message = DummyMessage(
+            function_call=DummyFunctionCall(json.dumps({"stories": stories}))
+        )
+        return DummyResponse(DummyChoice(message))
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", fake_create)
+    monkeypatch.setattr("time.sleep", lambda s: None)
+    monkeypatch.setattr(core_module, "_estimate_tokens", lambda model, text: 10)
+    monkeypatch.setenv("GGI_BATCH_TOKENS", "24")  # two lines per sub-batch
+
+    result = expand_stories_batch(lines, model="gpt-test")
+
+    batch_prompts = [p for p in prompts if p.startswith("Generate complete")]
+    assert {len(re.findall(r"^- ", p, re.M)) for p in batch_prompts} == {2}
+    assert set(result) == set(lines)
+    assert "single" in result[lines[0]] and "single" in result[lines[1]]
+    assert all("batched" in result[a] for a in lines[2:])
+
+
+def test_pack_batches_keeps_oversized_line_alone():
+    from github_gpt_issues.core import _pack_batches
+
+    batches = _pack_batches(["a" * 400, "b", "c"], "unknown-model", budget=20)
+    assert batches == [["a" * 400], ["b", "c"]]
+
+
+class FakeBatchAPI(requests.Session):
+    """Serves the OpenAI /files and /batches endpoints; jobs finish after one poll"""
+
+    def __init__(self, status=200):
+        super().__init__()
+        self.status = status
+        self.uploads = []
+        self.calls = []
+        self.created = 0
+        self.retrieves = 0
+        self.final_status = "completed"
+
+    def request(self, method, url, headers=None, timeout=None, **kwargs):
+        path = url.removeprefix("https://api.openai.com/v1")
+        self.calls.append((method, path, headers["Authorization"]))
+        if self.status != 200:
+            return self._response(b'{"error": {}}', self.status)
+        if (method, path) == ("POST", "/files"):
+            assert kwargs["data"] == {"purpose": "batch"}
+            payload = kwargs["files"]["file"][1]
+            self.uploads.append([json.loads(line) for line in payload.splitlines()])
+            return self._response({"id": "file-in"})
+        if (method, path) == ("POST", "/batches"):
+            assert kwargs["json"]["input_file_id"] == "file-in"
+            self.created += 1
+            return self._response(self._job("in_progress"))
+        if (method, path) == ("GET", "/batches/batch-1"):
+            self.retrieves += 1
+            return self._response(self._job(self.final_status))
+        if (method, path) == ("GET", "/files/file-out/content"):
+            return self._response(self._output())
+        return self._response(b"{}", 404)
+
+    def _output(self):
+        lines = []
+        for request in self.uploads[-1]:
+            actor = request["body"]["messages"][-1]["content"]
+            story = {
+                "actor_line": actor,
+                "description": "Batched",
+                "acceptance_criteria": ["C"],
+            }
+            message = {
+                "function_call": {
+                    "name": "create_user_story",
+                    "arguments": json.dumps(story),
+                }
+            }
+            response = {"body": {"choices": [{"message": message}]}}
+            lines.append(
+                json.dumps({"custom_id": request["custom_id"], "response": response})
+            )
+        return "\n".join(lines).encode()
+
+    @staticmethod
+    def _job(status):
+        return {"id": "batch-1", "status": status, "output_file_id": "file-out"}
+
+    @staticmethod
+    def _response(body, status=200):
+        response = requests.Response()
+        response.status_code = status
+        response._content = (
+            body if isinstance(body, bytes) else json.dumps(body).encode()
+        )
+        return response
+
+
+@pytest.fixture
+def batch_api(monkeypatch):
+    fake = FakeBatchAPI()
+    monkeypatch.setattr(openai, "requestssession", fake, raising=False)
+    monkeypatch.setattr(openai, "api_key", "sk-test", raising=False)
+    monkeypatch.setattr("time.sleep", lambda s: None)
+    return fake
+
+
+def test_expand_stories_batch_api(batch_api, tmp_path):
+    cache = tmp_path / "cache.jsonl"
+
+    result = expand_stories_batch(
+        ["A1", "A2"], model="gpt-test", use_batch_api=True, cache_file=str(cache)
+    )
+
+    assert [r["body"]["messages"][-1]["content"] for r in batch_api.uploads[0]] == [
+        "A1",
+        "A2",
+    ]
+    assert batch_api.created == 1 and batch_api.retrieves == 1
+    assert "Batched" in result["A1"] and "Batched" in result["A2"]
+    assert "batch-1" in cache.read_text()
+
+
+def test_expand_stories_batch_api_resumes_job(batch_api, tmp_path):
+    import github_gpt_issues.core as core_module
+
+    cache = tmp_path / "cache.jsonl"
+    expand_stories_batch(
+        ["A1", "A2"], model="gpt-test", use_batch_api=True, cache_file=str(cache)
+    )
+    # Simulate a run interrupted after submitting: only the job id was saved
+    job_lines = [ln for ln in cache.read_text().splitlines() if "batch-job:" in ln]
+    cache.write_text("\n".join(job_lines) + "\n")
+    core_module._CACHES.clear()
+    core_module._EXPANSIONS.clear()
+
+    expand_stories_batch(
+        ["A1", "A2"], model="gpt-test", use_batch_api=True, cache_file=str(cache)
+    )
+
+    assert batch_api.created == 1  # second run polls the recorded job
+    assert batch_api.retrieves == 2
+
+
+def test_expand_stories_batch_api_forgets_dead_job(batch_api, tmp_path):
+    """A job that failed is not resumed; the next run submits a new one"""
+    import github_gpt_issues.core as core_module
+
+    cache = str(tmp_path / "cache.jsonl")
+    batch_api.final_status = "expired"
+    expand_stories_batch(["A1"], model="gpt-test", use_batch_api=True, cache_file=cache)
+    core_module._CACHES.clear()
+    core_module._EXPANSIONS.clear()
+
+    batch_api.final_status = "completed"
+    result = expand_stories_batch(
+        ["A1"], model="gpt-test", use_batch_api=True, cache_file=cache
+    )
+
+    assert batch_api.created == 2
+    assert "Batched" in result["A1"]
+
+
+def test_expand_stories_batch_api_max_wait(batch_api, tmp_path, monkeypatch, caplog):
+    """Past GGI_BATCH_MAX_WAIT the run falls back but keeps the job to resume"""
+    monkeypatch.setenv("GGI_BATCH_MAX_WAIT", "0")
+    cache = tmp_path / "cache.jsonl"
+
+    result = expand_stories_batch(
+        ["A1"], model="gpt-test", use_batch_api=True, cache_file=str(cache)
+    )
+
+    assert batch_api.retrieves == 0
+    assert "Batched" not in result["A1"]
+    assert log_contains(caplog, "still in_progress")
+    assert "batch-1" in cache.read_text()
+
+
+def test_expand_stories_batch_api_sends_key(batch_api):
+    expand_stories_batch(["A1"], model="gpt-test", use_batch_api=True)
+
+    assert [(m, p) for m, p, _ in batch_api.calls] == [
+        ("POST", "/files"),
+        ("POST", "/batches"),
+        ("GET", "/batches/batch-1"),
+        ("GET", "/files/file-out/content"),
+    ]
+    assert {auth for _, _, auth in batch_api.calls} == {"Bearer sk-test"}
+
+
+@pytest.mark.parametrize("status", [404, 503], ids=["not-found", "unavailable"])
+def test_expand_stories_batch_api_unavailable(batch_api, caplog, status):
+    batch_api.status = status
+
+    result = expand_stories_batch(["A1", "A2"], model="gpt-test", use_batch_api=True)
+
+    assert "Desc1" in result["A1"]  # regular chat completion path
+    assert log_contains(caplog, "Batch API failed")
+    # Server errors are retried; a missing endpoint is not
+    assert len(batch_api.calls) == (1 if status == 404 else 4)
+
+
+def test_expand_stories_batch_halves_on_context_overflow(monkeypatch):
+    """Batches rejected for length are split, not sent one story at a time"""
+    import re
+
+    lines = [f"As user {i}, I want feature {i}" for i in range(12)]
+    sizes = []
+
+    def fake_create(**kwargs):
+        assert kwargs["functions"][0]["name"] == "create_user_stories_batch"
+        requested = re.findall(r"^- (.+)$", kwargs["messages"][-1]["content"], re.M)
+        sizes.append(len(requested))
+        if len(requested) > 3:
+            raise APIError("This model's maximum context length is 8192 tokens")
+        stories = [
+            {"actor_line": a, "description": "ok", "acceptance_criteria": []}
+            for a in requested
+        ]
+        message = DummyMessage(
+            function_call=DummyFunctionCall(json.dumps({"stories": stories}))
+        )
+        return DummyResponse(DummyChoice(message))
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", fake_create)
+    monkeypatch.setattr("time.sleep", lambda s: None)
+    monkeypatch.setenv("GGI_CONCURRENCY", "1")  # deterministic request order
+
+    result = expand_stories_batch(lines, model="gpt-test")
+
+    assert set(result) == set(lines)
+    # chunk_size caps the first requests at 10; overflowing ones are halved
+    assert sizes[:3] == [10, 5, 2]
+    assert max(sizes) == 10 and sorted(sizes).count(10) == 1
+    assert 2 in sizes and 1 not in sizes
+
+
+def test_pack_batches_caps_items_per_batch():
+    from github_gpt_issues.core import _pack_batches
+
+    batches = _pack_batches(
+        [str(i) for i in range(25)], "unknown-model", budget=10_000, max_items=10
+    )
+    assert [len(b) for b in batches] == [10, 10, 5]
+
+
+def test_expand_stories_batch_requests_duplicates_once(monkeypatch):
+    prompts = []
+    batch_create = openai.ChatCompletion.create
+
+    def recording_create(**kwargs):
+        prompts.append(kwargs["messages"][-1]["content"])
+        return batch_create(**kwargs)
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", recording_create)
+
+    result = expand_stories_batch(["A1", "A2", "A1", "A2"], model="gpt-test")
+
+    assert set(result) == {"A1", "A2"}
+    assert prompts == ["Generate complete user stories for:\n- A1\n- A2"]
+
+
+def test_batch_header_rendered_once_per_template(tmp_path, monkeypatch):
+    import github_gpt_issues.core as core_module
+
+    tpl = tmp_path / "prompt.md"
+    tpl.write_text("Tone: {{ tone }}{{ actor_line }}")
+    renders = []
+
+    class CountingTemplate:
+        def render(self, **context):
+            renders.append(context)
+            return f"Tone: {context['tone']}"
+
+    monkeypatch.setattr(
+        core_module, "_load_template", lambda path, mtime: CountingTemplate()
+    )
+    prompts = []
+    batch_create = openai.ChatCompletion.create
+
+    def recording_create(**kwargs):
+        prompts.append(kwargs["messages"][-1]["content"])
+        return batch_create(**kwargs)
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", recording_create)
+
+    for tone in ("formal", "formal", "casual"):
+        core_module._EXPANSIONS.clear()
+        expand_stories_batch(["A1", "A2"], tone=tone, prompt_template_path=str(tpl))
+
+    assert [r["tone"] for r in renders] == ["formal", "casual"]
+    assert prompts[0].startswith("Tone: formal\n\n") and prompts[2].startswith(
+        "Tone: casual\n\n"
+    )
+
+
+def test_expand_stories_batch_uses_cache_file(tmp_path, monkeypatch):
+    """Batch results are persisted and a later run makes no API calls"""
+    import github_gpt_issues.core as core_module
+
+    cache = tmp_path / "cache.jsonl"
+    first = expand_stories_batch(["A1", "A2"], model="gpt-test", cache_file=str(cache))
+    assert len(cache.read_text().splitlines()) == 2
+
+    core_module._CACHES.clear()
+    core_module._EXPANSIONS.clear()
+
+    def no_api(**kwargs):
+        raise AssertionError("cached stories must not be requested")
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", no_api)
+    second = expand_stories_batch(["A1", "A2"], model="gpt-test", cache_file=str(cache))
+    assert second == first
+
+    # A different model is a different prompt, so it misses the cache
+    monkeypatch.setattr("time.sleep", lambda s: None)
+    other = expand_stories_batch(["A1"], model="other", cache_file=str(cache))
+    assert "Failed to expand story" in other["A1"]
+
+
+def test_expand_stories_batch_single_line_skips_batch_schema(monkeypatch):
+    functions = []
+
+    def fake_create(**kwargs):
+        functions.append(kwargs["functions"][0]["name"])
+        payload = {
+            "actor_line": kwargs["messages"][-1]["content"],
+            "description": "single",
+            "acceptance_criteria": [],
+        }
+        message = DummyMessage(function_call=DummyFunctionCall(json.dumps(payload)))
+        return DummyResponse(DummyChoice(message))
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", fake_create)
+
+    result = expand_stories_batch(["As a user, want one"], model="gpt-test")
+
+    assert functions == ["create_user_story"]
+    assert "single" in result["As a user, want one"]
+
+
+def test_expand_stories_batch_salvages_truncated_payload(monkeypatch):
+    """Stories complete before the payload broke off are kept; only the rest fall back"""
+    import github_gpt_issues.core as core_module
+
+    stories = [
+        {"actor_line": a, "description": f"Desc {a}", "acceptance_criteria": []}
+        for a in ("A1", "A2", "A3")
+    ]
+    truncated = json.dumps({"stories": stories})[:-40]
+
+    def fake_create(**kwargs):
+        message = DummyMessage(function_call=DummyFunctionCall(truncated))
+        return DummyResponse(DummyChoice(message))
+
+    fallback = []
+
+    def fake_expand(actor_line, **kwargs):
+        fallback.append(actor_line)
+        return f"story_{actor_line}"
+
+    monkeypatch.setattr(openai.ChatCompletion, "create", fake_create)
+    monkeypatch.setattr(core_module, "expand_story", fake_expand)
+
+    result = expand_stories_batch(["A1", "A2", "A3"], model="gpt-test")
+
+    assert fallback == ["A3"]
+    assert "Desc A1" in result["A1"] and "Desc A2" in result["A2"]
+    assert result["A3"] == "story_A3"
+    assert core_module._salvage_stories('{"stories": [INVALID') == []
@@ -1,11 +1,15 @@
 import json
-import tempfile
-from pathlib import Path
 import pytest
 from github_gpt_issues.core import expand_story
 
 # import Dummy classes and patch fixture
-from tests.conftest import DummyResponse, DummyChoice, DummyMessage, DummyFunctionCall
+from tests.conftest import (
+    DummyResponse,
+    DummyChoice,
+    DummyMessage,
+    DummyFunctionCall,
+    log_contains,
+)
 import github_gpt_issues.core as core_module
 
 
@@ -55,8 +59,121 @@ def test_expand_story_cache_write(tmp_path):
     # Check returned body from fake_create
     assert "Cached description" in result
 
-    # Verify cache file created and contains the new entry
+    # Verify cache file created and contains the new entry, keyed by a hash
+    # of the request rather than the raw actor line
     assert cache_file.exists()
     data = json.loads(cache_file.read_text())
-    assert actor in data
-    assert data[actor] == result
+    assert data == {core_module._cache_key("gpt-4", actor): result}
+
+
+def test_expand_story_cache_appends_entries(tmp_path):
+    """Each miss appends one JSON line instead of rewriting the whole file"""
+    cache_file = tmp_path / "story_cache3.json"
+
+    expand_story("As a user, want C", cache_file=str(cache_file))
+    expand_story("As a user, want D", cache_file=str(cache_file))
+
+    lines = cache_file.read_text().splitlines()
+    assert len(lines) == 2
+    assert [list(json.loads(line)) for line in lines] == [
+        [core_module._cache_key("gpt-4", "As a user, want C")],
+        [core_module._cache_key("gpt-4", "As a user, want D")],
+    ]
+
+
+def test_expand_story_cache_key_covers_request(tmp_path, monkeypatch):
+    """Changing the model, the rendered template or PROMPT_VERSION misses the cache"""
+    cache_file = str(tmp_path / "keyed_cache.json")
+    tpl = tmp_path / "prompt.md"
+    tpl.write_text("Story: {{ actor_line }}")
+    actor = "As a user, want K"
+
+    keys = {
+        core_module._cache_key("gpt-4", actor),
+        core_module._cache_key("gpt-3.5-turbo", actor),
+        core_module._cache_key("gpt-4", f"Story: {actor}"),
+    }
+    expand_story(actor, cache_file=cache_file)
+    expand_story(actor, model="gpt-3.5-turbo", cache_file=cache_file)
+    expand_story(actor, prompt_template_path=str(tpl), cache_file=cache_file)
+
+    assert set(core_module._load_cache(cache_file)) == keys
+
+    monkeypatch.setattr(core_module, "PROMPT_VERSION", "next")
+    assert core_module._cache_key("gpt-4", actor) not in keys
+
+
+def test_expand_story_cache_reads_legacy_json(tmp_path, monkeypatch):
+    """A pretty-printed single-object cache still hits and is migrated to JSON Lines"""
+    cache_file = tmp_path / "legacy_cache.json"
+    existing = {"As a user, want E": "Body E", "As a user, want F": "Body F"}
+    cache_file.write_text(json.dumps(existing, indent=2))
+
+    def error_call(*args, **kwargs):
+        raise RuntimeError("OpenAI should not be called when cache hits")
+
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", error_call)
+
+    assert expand_story("As a user, want F", cache_file=str(cache_file)) == "Body F"
+    migrated = [json.loads(line) for line in cache_file.read_text().splitlines()]
+    assert migrated == [
+        {"As a user, want E": "Body E"},
+        {"As a user, want F": "Body F"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "content",
+    ['{"As a user, want A": "Body A"}', '{"As a user, want A": "Body A"}\n{"x": "y'],
+    ids=["compact-legacy", "truncated-last-line"],
+)
+def test_expand_story_cache_appends_after_missing_newline(tmp_path, content):
+    """A file not ending in a newline is rewritten before the next append"""
+    cache_file = tmp_path / "no_newline_cache.json"
+    cache_file.write_text(content)
+
+    assert expand_story("As a user, want A", cache_file=str(cache_file)) == "Body A"
+    body = expand_story("As a user, want B", cache_file=str(cache_file))
+    core_module._CACHES.clear()  # force a re-read from disk
+
+    cache = core_module._load_cache(str(cache_file))
+    assert cache["As a user, want A"] == "Body A"
+    assert cache[core_module._cache_key("gpt-4", "As a user, want B")] == body
+
+
+def test_expand_story_cache_skips_corrupt_lines(tmp_path, caplog):
+    cache_file = tmp_path / "corrupt_cache.json"
+    cache_file.write_text('{"As a user, want G": "Body G"}\n{not json\n')
+
+    caplog.set_level("WARNING", logger="github_gpt_issues.core")
+    assert expand_story("As a user, want G", cache_file=str(cache_file)) == "Body G"
+    assert log_contains(caplog, "Could not load 1 cache entries")
+
+
+def test_expand_story_cache_stdlib_json_fallback(tmp_path, monkeypatch):
+    """Without orjson the cache round-trips through the stdlib json module"""
+    monkeypatch.setattr(core_module, "_loads", json.loads)
+    monkeypatch.setattr(
+        core_module, "_dumps", lambda obj: json.dumps(obj).encode("utf-8")
+    )
+    cache_file = tmp_path / "stdlib_cache.json"
+
+    body = expand_story("As a user, want H", cache_file=str(cache_file))
+    core_module._CACHES.clear()  # force a re-read from disk
+
+    assert expand_story("As a user, want H", cache_file=str(cache_file)) == body
+
+
+def test_cache_compacts_superseded_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(core_module, "_COMPACT_MIN_LINES", 4)
+    cache_file = str(tmp_path / "compact_cache.json")
+    core_module._load_cache(cache_file)
+
+    core_module._append_cache(cache_file, "live", "kept")
+    for attempt in range(20):
+        core_module._append_cache(cache_file, "job", f"job-{attempt}")
+
+    lines = [json.loads(line) for line in open(cache_file)]
+    assert len(lines) <= 4
+    core_module._CACHES.clear()
+    assert core_module._load_cache(cache_file) == {"live": "kept", "job": "job-19"}
@@ -69,6 +69,23 @@ def test_parse_markdown_basic():
     assert sec2["stories"] == ["As a tester, want Z"]
 
 
+def test_parse_markdown_line_boundaries():
+    """Matches never span lines; CRLF input and orphan stories are handled"""
+    md = (
+        "0.1. **As an orphan, before any section**\r\n"
+        "##\r\n"
+        "1. Not a heading\r\n"
+        "## 1. Section One\r\n"
+        "1.1.\r\n"
+        "**As a user, split across lines**\r\n"
+        "  1.2. **As an admin, want Y**  \r\n"
+    )
+    sections = parse_markdown(md)
+    assert sections == [
+        {"number": "1", "title": "Section One", "stories": ["As an admin, want Y"]}
+    ]
+
+
 def test_expand_story_structured():
     actor = "As a user, want X"
     body = expand_story(actor, model="gpt-test")
@@ -79,6 +96,14 @@ def test_expand_story_structured():
     assert "- Second criterion" in body
 
 
+def test_expand_story_body_format():
+    body = expand_story("As a user, want Z", model="gpt-test")
+    assert body == (
+        "As a user, want Z\n\nThis is a description.\n\n"
+        "**Acceptance Criteria:**\n- First criterion\n- Second criterion\n"
+    )
+
+
 def test_expand_story_fallback(monkeypatch):
     import github_gpt_issues.core as core_module
 
@@ -107,3 +132,39 @@ def test_retry_non_retryable_error():
     with pytest.raises(ValueError):
         _retry(bad)
     assert calls["count"] == 1
+
+
+def test_expand_story_memoized_per_process(monkeypatch):
+    """A story expanded once is not sent to the API again, even via the batch path"""
+    import github_gpt_issues.core as core_module
+    from github_gpt_issues.core import expand_stories_batch
+
+    first = expand_story("As a user, want M", model="gpt-test")
+
+    def fail_create(*args, **kwargs):
+        raise AssertionError("memoized story must not call the API")
+
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", fail_create)
+    assert expand_story("As a user, want M", model="gpt-test") == first
+    assert expand_stories_batch(["As a user, want M"], model="gpt-test") == {
+        "As a user, want M": first
+    }
+
+
+def test_expand_story_failures_not_cached(monkeypatch, tmp_path):
+    import github_gpt_issues.core as core_module
+
+    cache_file = tmp_path / "cache.json"
+    working_create = core_module.openai.ChatCompletion.create
+
+    def raise_error(*args, **kwargs):
+        raise ValueError("API down")
+
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", raise_error)
+    failed = expand_story("As a user, want F", cache_file=str(cache_file))
+    assert "Failed to expand story" in failed
+    assert not cache_file.exists()
+
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", working_create)
+    recovered = expand_story("As a user, want F", cache_file=str(cache_file))
+    assert "This is a description." in recovered
@@ -1,63 +1,40 @@
 # tests/test_core_extended.py
 
-import pytest
 import json
-from types import SimpleNamespace
 from github_gpt_issues.core import expand_story, create_milestone_and_issues
 
-# The patch_openai fixture is provided in conftest.py
+# The patch_openai and dummy_repo fixtures are provided in conftest.py
 
 
-def test_expand_story_with_template(tmp_path):
-    # Create a simple prompt template
-    tpl = tmp_path / "prompt.md"
-    tpl.write_text(
-        "Generate a story for {{ actor_line }} with tone={{ tone }} and detail={{ detail_level }}"
-    )
+def test_expand_story_with_template(prompt_template):
     body = expand_story(
         actor_line="As a tester, want T",
         model="gpt-test",
         tone="friendly",
         detail_level="detailed",
-        prompt_template_path=str(tpl),
+        prompt_template_path=prompt_template,
     )
     assert "As a tester, want T" in body
     assert "This is a description." in body
 
 
-# Dummy classes for milestone and issue creation
-class DummyMilestone(SimpleNamespace):
-    pass
-
-
-class DummyIssue(SimpleNamespace):
-    pass
-
-
-class DummyRepo:
-    def __init__(self):
-        self.milestones = []
-        self.issues = []
-
-    def create_milestone(self, title):
-        m = DummyMilestone(title=title)
-        self.milestones.append(m)
-        return m
+def test_expand_story_template_read_once(prompt_template, monkeypatch):
+    """Ten expansions with one template read the file once"""
+    import builtins
+    import github_gpt_issues.core as core_module
 
-    def get_milestones(self):
-        return self.milestones
+    reads = []
 
-    def create_issue(self, title, body, milestone):
-        issue = DummyIssue(
-            number=len(self.issues) + 1, title=title, body=body, milestone=milestone
-        )
-        self.issues.append(issue)
-        return issue
+    def counting_open(path, *args, **kwargs):
+        reads.append(path)
+        return builtins.open(path, *args, **kwargs)
 
+    core_module._load_template.cache_clear()
+    monkeypatch.setattr(core_module, "open", counting_open, raising=False)
+    for n in range(10):
+        expand_story(f"As a tester, want {n}", prompt_template_path=prompt_template)
 
-@pytest.fixture
-def dummy_repo():
-    return DummyRepo()
+    assert reads == [prompt_template]
 
 
 def test_create_milestone_and_issues(dummy_repo):
@@ -92,3 +69,375 @@ def test_skip_duplicate(dummy_repo):
     # Milestone created but no issues
     assert len(dummy_repo.milestones) == 1
     assert len(dummy_repo.issues) == 0
+
+
+def test_create_issues_concurrently_isolates_failures(dummy_repo, monkeypatch):
+    """A failing create_issue must not stop the other issues from being created"""
+    from github import GithubException
+
+    monkeypatch.setattr("time.sleep", lambda s: None)
+    original_create = dummy_repo.create_issue
+
+    def flaky_create(title, body, milestone):
+        if title == "As a dev, want broken":
+            raise GithubException(422, "Validation Failed", None)
+        return original_create(title=title, body=body, milestone=milestone)
+
+    dummy_repo.create_issue = flaky_create
+    stories = [f"As a dev, want {c}" for c in "ABCDE"] + ["As a dev, want broken"]
+    section = {"title": "Epic C", "stories": stories}
+    existing = set()
+
+    create_milestone_and_issues(
+        dummy_repo,
+        section,
+        model="gpt-test",
+        existing_actor_lines=existing,
+        max_workers=4,
+    )
+
+    assert sorted(i.title for i in dummy_repo.issues) == sorted(stories[:-1])
+    assert existing == set(stories[:-1])
+
+
+def test_expand_story_template_compiled_once(tmp_path, monkeypatch):
+    """The template is parsed once per (path, mtime), not once per story"""
+    import os
+    import jinja2
+
+    tpl = tmp_path / "prompt.md"
+    tpl.write_text("Story for {{ actor_line }}{% if tone %} ({{ tone }}){% endif %}")
+    compiled = []
+    real_template = jinja2.Template
+
+    def counting_template(source):
+        compiled.append(source)
+        return real_template(source)
+
+    monkeypatch.setattr(jinja2, "Template", counting_template)
+
+    for actor in ("As a dev, want 1", "As a dev, want 2", "As a dev, want 3"):
+        assert actor in expand_story(actor, prompt_template_path=str(tpl))
+    assert compiled == [
+        "Story for {{ actor_line }}{% if tone %} ({{ tone }}){% endif %}"
+    ]
+
+    # Editing the file (new mtime) recompiles it
+    tpl.write_text("Edited {{ actor_line | trim }}")
+    stat = os.stat(tpl)
+    os.utime(tpl, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    expand_story("As a dev, want 4", prompt_template_path=str(tpl))
+    assert compiled[-1] == "Edited {{ actor_line | trim }}"
+
+
+def test_simple_template_matches_jinja(tmp_path, monkeypatch):
+    """Placeholder-only templates render like Jinja2 without compiling it"""
+    import jinja2
+    from github_gpt_issues.core import _get_template, _SimpleTemplate
+
+    context = {"actor_line": "As a dev, want {x}", "tone": "formal"}
+    sources = [
+        open("templates/prompt.md", encoding="utf-8").read(),
+        "> {{actor_line}} / {{ detail_level }} {braces} stay\n",
+        "no placeholders\n\n",
+        "Line1\r\n> {{ actor_line }}\r\n",
+        "Old Mac\r{{ tone }}\r",
+    ]
+    for source in sources:
+        simple = _SimpleTemplate.parse(source)
+        assert simple is not None
+        assert simple.render(**context) == jinja2.Template(source).render(**context)
+
+    for source in (
+        "{% if tone %}x{% endif %}",
+        "{{ actor_line | upper }}",
+        "{{ other }}",
+        "{# c #}",
+    ):
+        assert _SimpleTemplate.parse(source) is None
+
+    def no_jinja(source):
+        raise AssertionError("Jinja2 should not be used")
+
+    monkeypatch.setattr(jinja2, "Template", no_jinja)
+    tpl = tmp_path / "prompt.md"
+    tpl.write_text(sources[0])
+    assert "As a dev, want {x}" in _get_template(str(tpl)).render(**context)
+
+
+def test_configure_http_session_shares_pool(monkeypatch):
+    import openai
+    from github_gpt_issues.core import configure_http_session
+
+    monkeypatch.setattr(openai, "requestssession", None, raising=False)
+    session = configure_http_session(pool_size=16)
+
+    assert openai.requestssession is session
+    adapter = session.get_adapter("https://api.openai.com/v1/chat/completions")
+    assert adapter._pool_maxsize == 16
+
+    # By default one connection per request _openai_slots allows in flight
+    monkeypatch.setenv("GGI_CONCURRENCY", "3")
+    monkeypatch.setenv("GGI_SECTIONS", "4")
+    adapter = configure_http_session().get_adapter("https://api.openai.com/v1/")
+    assert adapter._pool_maxsize == 3
+
+
+def test_create_milestone_dedupes_section_and_accepts_list(dummy_repo):
+    """Repeated actor lines get one issue; a list of existing lines still filters"""
+    section = {
+        "title": "Epic D",
+        "stories": ["As a dev, want D", "As a dev, want E", "As a dev, want D"],
+    }
+
+    existing = ["As a dev, want E"]
+    create_milestone_and_issues(
+        dummy_repo,
+        section,
+        model="gpt-test",
+        existing_actor_lines=existing,
+    )
+
+    assert [i.title for i in dummy_repo.issues] == ["As a dev, want D"]
+    # Created stories are appended to a list argument
+    assert existing == ["As a dev, want E", "As a dev, want D"]
+
+
+def test_create_milestone_accepts_frozenset(dummy_repo):
+    """A read-only collection filters stories and is left untouched"""
+    existing = frozenset({"As a dev, want E"})
+    section = {"title": "Epic F", "stories": ["As a dev, want E", "As a dev, want F"]}
+
+    create_milestone_and_issues(dummy_repo, section, "gpt-test", existing)
+
+    assert [i.title for i in dummy_repo.issues] == ["As a dev, want F"]
+    assert existing == frozenset({"As a dev, want E"})
+
+
+def test_create_all_accepts_frozenset(dummy_repo):
+    """Sections share the stories they create without copying a read-only set"""
+    from github_gpt_issues.core import create_all_milestones_and_issues
+
+    existing = frozenset({"As a dev, want E"})
+    sections = [
+        {"title": "Epic G", "stories": ["As a dev, want E", "As a dev, want G"]},
+        {"title": "Epic H", "stories": ["As a dev, want G", "As a dev, want H"]},
+    ]
+
+    create_all_milestones_and_issues(dummy_repo, sections, "gpt-test", existing)
+
+    assert sorted(i.title for i in dummy_repo.issues) == [
+        "As a dev, want G",
+        "As a dev, want H",
+    ]
+    assert existing == frozenset({"As a dev, want E"})
+
+
+def test_truncate_issue_titles(dummy_repo):
+    from github_gpt_issues.core import _truncate
+
+    assert _truncate("x" * 50) == "x" * 50
+    assert _truncate("x" * 51) == "x" * 47 + "..."
+    assert len(_truncate("y" * 200, n=20)) == 20
+
+    long_line = "As a developer, I want a very long story title that overflows"
+    section = {"title": "Epic T", "stories": [long_line]}
+    create_milestone_and_issues(dummy_repo, section, "gpt-test", set())
+    assert dummy_repo.issues[0].title == long_line[:47] + "..."
+
+
+def test_create_all_runs_sections_concurrently_without_duplicates(
+    dummy_repo, monkeypatch
+):
+    import threading
+    import github_gpt_issues.core as core_module
+
+    sections = [
+        {"title": "Epic 1", "stories": ["As a dev, want 1", "As a dev, want shared"]},
+        {"title": "Epic 2", "stories": ["As a dev, want shared", "As a dev, want 2"]},
+        {"title": "Epic 3", "stories": ["As a dev, want 1"]},
+    ]
+    barrier = threading.Barrier(3, timeout=5)
+    real = core_module._create_section
+
+    def rendezvous(*args, **kwargs):
+        barrier.wait()  # deadlocks (and times out) unless sections overlap
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(core_module, "_create_section", rendezvous)
+    existing = {"As a dev, want 2"}
+
+    core_module.create_all_milestones_and_issues(
+        dummy_repo, sections, "gpt-test", existing
+    )
+
+    assert sorted(m.title for m in dummy_repo.milestones) == [
+        "Epic 1",
+        "Epic 2",
+        "Epic 3",
+    ]
+    by_title = {i.title: i.milestone.title for i in dummy_repo.issues}
+    assert by_title == {"As a dev, want 1": "Epic 1", "As a dev, want shared": "Epic 1"}
+    assert existing == {"As a dev, want 1", "As a dev, want 2", "As a dev, want shared"}
+
+
+def test_create_all_with_large_shared_set(dummy_repo):
+    """Sections adding to a large shared set never iterate it concurrently"""
+    import github_gpt_issues.core as core_module
+
+    existing = {f"As a user, want old {n}" for n in range(300_000)}
+    sections = [
+        {
+            "title": f"Epic {s}",
+            "stories": [f"As a dev, want {s}-{n}" for n in range(20)],
+        }
+        for s in range(6)
+    ]
+
+    core_module.create_all_milestones_and_issues(
+        dummy_repo, sections, "gpt-test", existing, max_sections=6
+    )
+
+    assert len(dummy_repo.issues) == 120
+    assert len(existing) == 300_120
+
+
+def test_create_all_normalizes_existing_lines_once(dummy_repo, monkeypatch):
+    """Existing lines are normalized by create_all only, never per section"""
+    import github_gpt_issues.core as core_module
+
+    existing = frozenset(f"As a user, want old {n}" for n in range(1000))
+    sections = [
+        {"title": f"Epic {s}", "stories": [f"As a dev, want {s}"]} for s in range(4)
+    ]
+    normalized = []
+    real_normalize = core_module.normalize_actor_line
+
+    def counting_normalize(actor_line):
+        normalized.append(actor_line)
+        return real_normalize(actor_line)
+
+    monkeypatch.setattr(core_module, "normalize_actor_line", counting_normalize)
+
+    core_module.create_all_milestones_and_issues(
+        dummy_repo, sections, "gpt-test", existing
+    )
+
+    assert len(dummy_repo.issues) == 4
+    assert len(normalized) == 1000 + 4
+
+
+def test_existing_lines_compared_ignoring_case_and_whitespace(dummy_repo):
+    existing = {"  as a DEV, want G "}
+    section = {
+        "title": "Epic G",
+        "stories": ["As a dev, want G", "As a dev, want H", "as a dev, want h"],
+    }
+
+    create_milestone_and_issues(dummy_repo, section, "gpt-test", existing)
+
+    # The first spelling of a story is kept for its title
+    assert [i.title for i in dummy_repo.issues] == ["As a dev, want H"]
+    assert existing == {"  as a DEV, want G ", "As a dev, want H"}
+
+
+def test_create_all_batches_stories_across_sections(dummy_repo, monkeypatch):
+    """Small sections share one batch request instead of sending one each"""
+    import re
+    import github_gpt_issues.core as core_module
+    from tests.conftest import (
+        DummyResponse,
+        DummyChoice,
+        DummyMessage,
+        DummyFunctionCall,
+    )
+
+    requests = []
+
+    def fake_create(**kwargs):
+        requested = re.findall(r"^- (.+)$", kwargs["messages"][-1]["content"], re.M)
+        requests.append(requested)
+        stories = [
+            {"actor_line": a, "description": "batched", "acceptance_criteria": []}
+            for a in requested
+        ]
+        arguments = json.dumps({"stories": stories})
+        message = DummyMessage(function_call=DummyFunctionCall(arguments))
+        return DummyResponse(DummyChoice(message))
+
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", fake_create)
+    sections = [
+        {
+            "title": f"Epic {n}",
+            "stories": [f"As a dev, want {n}a", f"As a dev, want {n}b"],
+        }
+        for n in range(3)
+    ]
+
+    core_module.create_all_milestones_and_issues(
+        dummy_repo, sections, "gpt-test", set()
+    )
+
+    assert len(requests) == 1
+    assert sorted(requests[0]) == sorted(a for s in sections for a in s["stories"])
+    assert len(dummy_repo.issues) == 6
+    assert all("batched" in i.body for i in dummy_repo.issues)
+
+
+def test_skeleton_template_matches_jinja(tmp_path, monkeypatch):
+    """Templates that output actor_line verbatim render from a cached skeleton"""
+    import jinja2
+    from github_gpt_issues.core import _get_template, _SkeletonTemplate
+
+    source = "{% if tone == 'formal' %}Dear PM,{% endif %}\n{{ actor_line }} ({{ detail_level }})"
+    tpl = tmp_path / "prompt.md"
+    tpl.write_text(source)
+    template = _get_template(str(tpl))
+    assert isinstance(template, _SkeletonTemplate)
+
+    renders = []
+    real_render = template.template.render
+    monkeypatch.setattr(
+        template.template,
+        "render",
+        lambda **kw: renders.append(kw) or real_render(**kw),
+    )
+    for actor in ("As a dev, want {x}", "As a dev, want y"):
+        for tone in ("formal", "casual"):
+            context = {"actor_line": actor, "tone": tone, "detail_level": "high"}
+            assert template.render(**context) == jinja2.Template(source).render(
+                **context
+            )
+    # Sentinel plus verification render once per tone, then plain joins
+    assert len(renders) == 4
+
+    for source in (
+        "{{ actor_line | upper }}",
+        "{% if actor_line %}{{ actor_line }}{% endif %}",
+        "{% filter upper %}{{ actor_line }}{% endfilter %}",
+    ):
+        assert _SkeletonTemplate.wrap(jinja2.Template(source), source) is None
+
+
+def test_create_all_expands_each_story_once(dummy_repo, monkeypatch):
+    """Sections reuse the up-front expansion, even for stories that failed"""
+    import github_gpt_issues.core as core_module
+
+    calls = []
+
+    def failing_batch(actor_lines, **kwargs):
+        calls.append(list(actor_lines))
+        return {a: f"{a}\n\n**Failed to expand story**" for a in actor_lines}
+
+    monkeypatch.setattr(core_module, "expand_stories_batch", failing_batch)
+    sections = [
+        {"title": "Epic 1", "stories": ["As a dev, want 1"]},
+        {"title": "Epic 2", "stories": ["As a dev, want 2"]},
+    ]
+
+    core_module.create_all_milestones_and_issues(
+        dummy_repo, sections, "gpt-test", set(), use_batch_api=True
+    )
+
+    assert calls == [["As a dev, want 1", "As a dev, want 2"]]
+    assert len(dummy_repo.issues) == 2
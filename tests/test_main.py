@@ -1,91 +1,342 @@
 import json
 import pytest
+from github import GithubException
 from github_gpt_issues.main import load_existing_actor_lines
+from tests.conftest import DummyIssue, DummyRepo, log_contains
 
 
-class DummyIssue:
-    def __init__(self, body):
-        self.body = body
+@pytest.mark.parametrize(
+    "bodies,expected",
+    [
+        (
+            (
+                "As a user, want X Details here.",
+                "Random body without actor line.",
+                None,  # no body
+                "As an admin, perform Y More text.",
+            ),
+            {"As a user, want X Details here.", "As an admin, perform Y More text."},
+        ),
+        # Only the first actor line of a body counts
+        (
+            ("As a user, want A\nAs an admin, perform B\nDetails...",),
+            {"As a user, want A"},
+        ),
+        # Surrounding whitespace is trimmed
+        (("  As a tester, want X   ",), {"As a tester, want X"}),
+    ],
+    ids=["basic", "first-line-only", "whitespace"],
+)
+def test_load_existing_actor_lines(make_repo, bodies, expected):
+    assert load_existing_actor_lines(make_repo(*bodies)) == expected
 
 
-class DummyRepo:
-    def __init__(self, issues):
-        self._issues = issues
+def test_actor_regex_compiled_once(make_repo, monkeypatch):
+    """main.py compiles _ACTOR_RE at import; extraction never recompiles it"""
+    import re
 
-    def get_issues(self, state):
-        return self._issues
+    compiled = []
+    real_compile = re.compile
 
+    def counting_compile(*args, **kwargs):
+        compiled.append(args)
+        return real_compile(*args, **kwargs)
 
-def test_load_existing_actor_lines_basic(caplog):
-    issues = [
-        DummyIssue("As a user, want X Details here."),
-        DummyIssue("Random body without actor line."),
-        DummyIssue(None),  # no body
-        DummyIssue("As an admin, perform Y More text."),
+    monkeypatch.setattr(re, "compile", counting_compile)
+    repo = make_repo("As a user, want X", "Notes\nAs an admin, want Y", None)
+    for _ in range(100):
+        load_existing_actor_lines(repo)
+
+    assert compiled == []
+
+
+def test_load_existing_actor_lines_scale():
+    """10k story issues (plus 100 without a body) are read 100 per page"""
+    pages = [
+        [{"body": f"As a user{i}, want X{i}\nDetails"} for i in range(n, n + 100)]
+        for n in range(0, 10_000, 100)
     ]
-    repo = DummyRepo(issues)
-    caplog.set_level("INFO")
+    pages.append([{"body": None}] * 100)
+    repo = DummyRepo([])
+    repo.url = "https://api.github.com/repos/org/repo"
+    repo._requester = DummyRequester(pages)
 
     existing = load_existing_actor_lines(repo)
 
-    # Should extract the full matched lines
-    assert existing == {
-        "As a user, want X Details here.",
-        "As an admin, perform Y More text.",
-    }
+    assert len(existing) == 10_000
+    assert "As a user9999, want X9999" in existing
+    assert len(repo._requester.requests) == 101
+
 
+def test_load_existing_actor_lines_streams_issues():
+    """Issues are consumed one at a time; memory does not grow with their number"""
+    import tracemalloc
+    from tests.conftest import StreamingDummyRepo
 
-def test_load_existing_actor_lines_handles_exception(caplog):
-    class BadRepo:
-        def get_issues(self, state):
-            raise ValueError("GitHub down")
+    load_existing_actor_lines(StreamingDummyRepo(1))  # lazy imports happen here
+    tracemalloc.start()
+    try:
+        existing = load_existing_actor_lines(StreamingDummyRepo(100_000))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
 
-    bad_repo = BadRepo()
+    assert len(existing) == 100
+    assert peak < 1_000_000
 
-    caplog.set_level("WARNING")
+
+def test_load_existing_actor_lines_handles_exception(caplog, bad_repo):
+    caplog.set_level("WARNING", logger="github_gpt_issues.main")
     existing = load_existing_actor_lines(bad_repo)
 
     assert existing == set()
-    assert any(
-        "Failed to load existing issues" in rec.message for rec in caplog.records
-    )
+    assert log_contains(caplog, "Failed to load existing issues")
 
 
-def test_load_existing_actor_lines_empty(caplog):
+def test_load_existing_actor_lines_empty(caplog, empty_repo):
     """When get_issues returns no issues, should return empty set with no warnings"""
-
-    class EmptyRepo:
-        def get_issues(self, state):
-            return []
-
-    repo = EmptyRepo()
-
-    caplog.set_level("INFO")
-    existing = load_existing_actor_lines(repo)
+    caplog.set_level("INFO", logger="github_gpt_issues.main")
+    existing = load_existing_actor_lines(empty_repo)
 
     assert existing == set()
     # No warnings logged
     assert not caplog.records
 
 
-def test_multiple_actor_lines_only_first(caplog):
-    """If an issue body contains multiple actor lines, only the first is captured"""
-    multiline_body = "As a user, want A\n" "As an admin, perform B\n" "Details..."
-    issues = [DummyIssue(multiline_body)]
-    repo = DummyRepo(issues)
-    caplog.set_level("INFO")
+def test_apply_limit_args_overrides_env(monkeypatch):
+    import os
+    from types import SimpleNamespace
+    from github_gpt_issues.main import apply_limit_args
 
-    existing = load_existing_actor_lines(repo)
+    monkeypatch.setenv("GGI_CONCURRENCY", "8")
+    monkeypatch.setenv("GGI_RPM", "500")
+    monkeypatch.delenv("GGI_TPM", raising=False)
 
-    assert existing == {"As a user, want A"}
+    apply_limit_args(SimpleNamespace(concurrency=20, rpm=None, tpm=90000))
 
+    assert os.environ["GGI_CONCURRENCY"] == "20"
+    assert os.environ["GGI_RPM"] == "500"
+    assert os.environ["GGI_TPM"] == "90000"
 
-def test_whitespace_trim(caplog):
-    """Extra whitespace around actor line should be trimmed"""
-    issues = [DummyIssue("  As a tester, want X   ")]
-    repo = DummyRepo(issues)
-    caplog.set_level("INFO")
 
-    existing = load_existing_actor_lines(repo)
+class DummySearchResults(list):
+    @property
+    def totalCount(self):
+        return len(self)
+
+
+class DummyGithub:
+    def __init__(self, results=None, error=None):
+        self.results = results
+        self.error = error
+        self.queries = []
+
+    def search_issues(self, query):
+        self.queries.append(query)
+        if self.error:
+            raise self.error
+        return self.results
+
+
+def test_load_existing_actor_lines_uses_search():
+    repo = DummyRepo([DummyIssue(body="As a user, want listed")])
+    repo.full_name = "org/repo"
+    gh = DummyGithub(DummySearchResults([DummyIssue(body="As a user, want searched")]))
+
+    existing = load_existing_actor_lines(repo, gh)
+
+    assert existing == {"As a user, want searched"}
+    assert gh.queries[0].startswith("repo:org/repo is:issue in:body")
+
+
+@pytest.mark.parametrize(
+    "gh",
+    [
+        DummyGithub(
+            DummySearchResults([DummyIssue(body="As a user, want searched")] * 1000)
+        ),
+        DummyGithub(error=GithubException(422, "Validation Failed", None)),
+    ],
+    ids=["result-limit", "search-error"],
+)
+def test_load_existing_actor_lines_search_falls_back(gh):
+    repo = DummyRepo([DummyIssue(body="As a user, want listed")])
+    repo.full_name = "org/repo"
+
+    assert load_existing_actor_lines(repo, gh) == {"As a user, want listed"}
+
+
+@pytest.fixture
+def cli(monkeypatch, tmp_path):
+    """Run main() against a fake GitHub; returns (run, calls)"""
+    import github_gpt_issues.core as core_module
+    import github_gpt_issues.main as main_module
+
+    markdown = tmp_path / "stories.md"
+    markdown.write_text("## 1. Epic\n1.1. **As a user, want A**\n")
+    calls = {"github": 0, "runs": 0}
+
+    class FakeGithub:
+        def __init__(self, token, **kwargs):
+            calls["github"] += 1
+            calls["github_kwargs"] = kwargs
+
+        def get_repo(self, name):
+            return DummyRepo([])
+
+    def fake_create_all(repo, sections, model, existing, **kwargs):
+        calls["runs"] += 1
+        existing.update(a for sec in sections for a in sec["stories"])
+
+    monkeypatch.setenv("GITHUB_TOKEN", "gh")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk")
+    monkeypatch.setattr("github.Github", FakeGithub)
+    monkeypatch.setattr(core_module, "configure_http_session", lambda: None)
+    monkeypatch.setattr(
+        core_module, "create_all_milestones_and_issues", fake_create_all
+    )
+
+    def run(*extra):
+        argv = ["main", "--markdown", str(markdown), "--repo", "org/repo", *extra]
+        monkeypatch.setattr("sys.argv", argv)
+        main_module.main()
+
+    run.markdown = markdown
+    return run, calls
+
 
-    assert existing == {"As a tester, want X"}
+def test_state_file_skips_unchanged_markdown(cli, tmp_path):
+    run, calls = cli
+    state = str(tmp_path / "state.json")
+
+    run("--state-file", state)
+    run("--state-file", state)
+    assert (calls["github"], calls["runs"]) == (1, 1)
+
+    run("--state-file", state, "--force")
+    assert calls["runs"] == 2
+
+    run.markdown.write_text("## 1. Epic\n1.1. **As a user, want B**\n")
+    run("--state-file", state)
+    assert calls["runs"] == 3
+    assert json.load(open(state))["repo"] == "org/repo"
+
+
+def test_github_client_pages_and_pool(cli, monkeypatch):
+    run, calls = cli
+    monkeypatch.setenv("GGI_CONCURRENCY", "5")
+    monkeypatch.setenv("GGI_SECTIONS", "3")
+
+    run()
+
+    # Requests in flight are capped at GGI_CONCURRENCY, whatever GGI_SECTIONS is
+    assert calls["github_kwargs"] == {"per_page": 100, "pool_size": 5}
+
+
+class DummyRequester:
+    """Serves issue pages the way PyGithub's Requester.requestJson does"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def requestJson(self, verb, url, parameters=None):
+        self.requests.append((url, parameters))
+        page = len(self.requests)
+        headers = {}
+        if page < len(self.pages):
+            headers["link"] = (
+                f'<https://api.github.com/repositories/1/issues?page={page + 1}>; rel="next"'
+            )
+        return 200, headers, json.dumps(self.pages[page - 1])
+
+
+def test_load_existing_actor_lines_reads_raw_pages():
+    repo = DummyRepo([])
+    repo.url = "https://api.github.com/repos/org/repo"
+    repo._requester = DummyRequester(
+        [
+            [{"body": "As a user, want A"}, {"body": None}],
+            [{"body": "Notes\nAs an admin, want B\nMore"}],
+        ]
+    )
+
+    assert load_existing_actor_lines(repo) == {
+        "As a user, want A",
+        "As an admin, want B",
+    }
+    assert repo._requester.requests == [
+        (
+            "https://api.github.com/repos/org/repo/issues",
+            {"state": "all", "per_page": 100},
+        ),
+        ("https://api.github.com/repositories/1/issues?page=2", None),
+    ]
+
+
+def test_load_existing_actor_lines_retries_failed_page(monkeypatch):
+    """A page that fails with a 502 is fetched again, not the whole listing"""
+    from types import SimpleNamespace
+
+    sleeps = []
+    monkeypatch.setattr("time.sleep", sleeps.append)
+    served = DummyRequester(
+        [[{"body": "As a user, want A"}], [{"body": "As an admin, want B"}]]
+    )
+    urls = []
+
+    def request_json(verb, url, parameters=None):
+        urls.append(url)
+        if len(urls) == 2:
+            return 502, {}, '{"message": "Bad Gateway"}'
+        return served.requestJson(verb, url, parameters)
+
+    repo = DummyRepo([])
+    repo.url = "https://api.github.com/repos/org/repo"
+    repo._requester = SimpleNamespace(requestJson=request_json)
+
+    assert load_existing_actor_lines(repo) == {
+        "As a user, want A",
+        "As an admin, want B",
+    }
+    page_two = "https://api.github.com/repositories/1/issues?page=2"
+    assert urls == [f"{repo.url}/issues", page_two, page_two]
+    assert len(sleeps) == 1
+
+
+@pytest.mark.parametrize(
+    "response",
+    [(404, {}, '{"message": "Not Found"}'), (200, {}, '[{"body": "As a user, w')],
+    ids=["not-found", "truncated-json"],
+)
+def test_load_existing_actor_lines_raw_page_error(caplog, response):
+    class FailingRequester:
+        def requestJson(self, verb, url, parameters=None):
+            return response
+
+    repo = DummyRepo([])
+    repo.url = "https://api.github.com/repos/org/missing"
+    repo._requester = FailingRequester()
+
+    assert load_existing_actor_lines(repo) == set()
+    assert log_contains(caplog, "Failed to load existing issues")
+
+
+def test_help_does_not_import_api_clients():
+    import subprocess
+    import sys
+
+    code = (
+        "import sys; sys.argv = ['main', '--help']\n"
+        "import github_gpt_issues.main as m\n"
+        "try:\n    m.main()\nexcept SystemExit:\n    pass\n"
+        "print(sorted({'openai', 'github'} & set(sys.modules)))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd="src",
+        check=True,
+    ).stdout
+    assert out.strip().splitlines()[-1] == "[]"
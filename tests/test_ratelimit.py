@@ -0,0 +1,444 @@
+import pytest
+import github_gpt_issues.core as core_module
+from github_gpt_issues.core import _TokenBucket, _retry, RateLimitError
+
+
+class FakeClock:
+    """Deterministic replacement for time.monotonic/time.sleep"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr("time.monotonic", fake.monotonic)
+    monkeypatch.setattr("time.sleep", fake.sleep)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def reset_buckets():
+    core_module._token_bucket.cache_clear()
+    yield
+    core_module._token_bucket.cache_clear()
+
+
+def test_token_bucket_paces_requests(clock):
+    bucket = _TokenBucket(per_minute=60)  # one token per second, burst of 60
+    for _ in range(60):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_token_bucket_caps_oversized_requests(clock):
+    bucket = _TokenBucket(per_minute=10)
+    bucket.acquire(1000)  # larger than capacity: drains the bucket, no deadlock
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_token_bucket_sleeps_without_lock(clock, monkeypatch):
+    """A waiting caller releases the lock, and re-checks the bucket on waking"""
+    bucket = _TokenBucket(per_minute=60)
+    bucket.acquire(60)
+    held = []
+
+    def sleep(seconds):
+        held.append(bucket._lock.locked())
+        clock.sleep(seconds)
+        if len(held) == 1:
+            bucket.tokens -= 0.5  # another caller took part of the refill
+
+    monkeypatch.setattr("time.sleep", sleep)
+    bucket.acquire(1)
+
+    assert held == [False, False]
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(0.5)]
+
+
+def test_chat_completion_uses_configured_buckets(monkeypatch, clock):
+    monkeypatch.setenv("GGI_RPM", "1")
+    monkeypatch.setenv("GGI_TPM", "100000")
+    calls = []
+    monkeypatch.setattr(
+        core_module.openai.ChatCompletion, "create", lambda **k: calls.append(k)
+    )
+    messages = [{"role": "user", "content": "As a user, want X"}]
+
+    core_module._chat_completion(model="gpt-test", messages=messages)
+    core_module._chat_completion(model="gpt-test", messages=messages)
+
+    assert len(calls) == 2
+    # Second request waits for the single-request-per-minute bucket to refill
+    assert sum(clock.sleeps) == pytest.approx(60.0)
+
+
+def test_chat_completion_unthrottled_by_default(monkeypatch, clock):
+    monkeypatch.delenv("GGI_RPM", raising=False)
+    monkeypatch.delenv("GGI_TPM", raising=False)
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", lambda **k: "ok")
+
+    assert core_module._chat_completion(model="gpt-test", messages=[]) == "ok"
+    assert clock.sleeps == []
+
+
+def test_retry_honors_retry_after(clock):
+    calls = {"count": 0}
+
+    def limited():
+        calls["count"] += 1
+        if calls["count"] == 1:
+            e = RateLimitError("slow down")
+            e.headers = {"Retry-After": "7"}
+            raise e
+        return "done"
+
+    assert _retry(limited, initial_delay=1) == "done"
+    assert clock.sleeps == [7.0]
+
+
+def test_retry_after_http_date(monkeypatch):
+    from email.utils import format_datetime
+    from datetime import datetime, timezone
+
+    monkeypatch.setattr("time.time", lambda: 1_000_000.0)
+    when = datetime.fromtimestamp(1_000_030.0, tz=timezone.utc)
+    exc = RateLimitError("slow down")
+    exc.headers = {"retry-after": format_datetime(when, usegmt=True)}
+
+    assert core_module._retry_after(exc) == pytest.approx(30.0)
+
+
+def test_retry_after_absent_or_invalid():
+    assert core_module._retry_after(RateLimitError("no headers")) is None
+    exc = RateLimitError("bad header")
+    exc.headers = {"Retry-After": "soon"}
+    assert core_module._retry_after(exc) is None
+
+
+def test_retry_full_jitter_bounds(monkeypatch, clock):
+    """Each wait is drawn from [0, delay] with delay growing exponentially"""
+    bounds = []
+
+    def fake_uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr("random.uniform", fake_uniform)
+
+    def always_limited():
+        raise RateLimitError("busy")
+
+    with pytest.raises(RateLimitError):
+        _retry(always_limited, max_retries=3, initial_delay=1, backoff_multiplier=2)
+
+    assert bounds == [(0, 1), (0, 2), (0, 4)]
+
+
+def test_retry_server_errors_back_off_to_lower_cap(monkeypatch, clock):
+    """5xx responses back off exponentially, with full jitter, up to max_delay / 4"""
+    from github import GithubException
+
+    bounds = []
+
+    def fake_uniform(low, high):
+        bounds.append((low, high))
+        return high
+
+    monkeypatch.setattr("random.uniform", fake_uniform)
+
+    def unavailable():
+        raise GithubException(503, "Service Unavailable", None)
+
+    with pytest.raises(GithubException):
+        _retry(unavailable, max_retries=6, initial_delay=1, max_delay=16)
+
+    assert clock.sleeps == [1, 2, 4, 4, 4, 4]
+    assert bounds == [(0, s) for s in clock.sleeps]
+
+
+def test_retry_delay_capped_at_max_delay(monkeypatch, clock):
+    monkeypatch.setattr("random.uniform", lambda low, high: high)
+
+    def always_limited():
+        raise RateLimitError("busy")
+
+    with pytest.raises(RateLimitError):
+        _retry(always_limited, max_retries=6, initial_delay=4, max_delay=10)
+
+    assert clock.sleeps == [4, 8, 10, 10, 10, 10]
+
+
+def test_retry_default_budget_depends_on_error(monkeypatch, clock):
+    """Rate limits get RATE_LIMIT_RETRIES attempts, other errors DEFAULT_RETRIES"""
+    from github_gpt_issues.core import APIError, DEFAULT_RETRIES, RATE_LIMIT_RETRIES
+
+    def raiser(exc_type):
+        calls = []
+
+        def func():
+            calls.append(1)
+            raise exc_type("nope")
+
+        return func, calls
+
+    limited, limited_calls = raiser(RateLimitError)
+    with pytest.raises(RateLimitError):
+        _retry(limited)
+    failing, failing_calls = raiser(APIError)
+    with pytest.raises(APIError):
+        _retry(failing)
+
+    assert len(limited_calls) == RATE_LIMIT_RETRIES + 1
+    assert len(failing_calls) == DEFAULT_RETRIES + 1
+
+
+def test_retry_waits_for_github_rate_limit_reset(monkeypatch, clock):
+    from github import GithubException
+
+    monkeypatch.setattr("time.time", lambda: 1_000_000.0)
+    calls = []
+
+    def exhausted():
+        calls.append(1)
+        if len(calls) == 1:
+            headers = {"x-ratelimit-remaining": "0", "x-ratelimit-reset": "1000042"}
+            raise GithubException(403, {"message": "API rate limit exceeded"}, headers)
+        return "done"
+
+    assert _retry(exhausted, initial_delay=1) == "done"
+    assert clock.sleeps == [pytest.approx(42.0)]
+
+
+def test_retry_does_not_repeat_github_client_errors(clock):
+    from github import GithubException
+
+    calls = []
+
+    def invalid():
+        calls.append(1)
+        raise GithubException(422, {"message": "Validation Failed"}, {})
+
+    def forbidden():
+        calls.append(1)
+        raise GithubException(403, {"message": "Resource not accessible"}, {})
+
+    for func in (invalid, forbidden):
+        with pytest.raises(GithubException):
+            _retry(func)
+
+    assert len(calls) == 2
+    assert clock.sleeps == []
+
+
+def _server_error(status):
+    e = core_module.APIError(f"{status} Server Error")
+    e.http_status = status
+    return e
+
+
+@pytest.mark.parametrize(
+    "outage",
+    [
+        lambda: core_module.Timeout("Request timed out"),
+        lambda: core_module.APIConnectionError("Connection refused"),
+        lambda: core_module.ServiceUnavailableError("Overloaded"),
+        lambda: core_module.TryAgain("Try again"),
+        lambda: _server_error(503),
+    ],
+    ids=["timeout", "connection", "unavailable", "try-again", "api-5xx"],
+)
+def test_circuit_breaker_fails_fast_during_outage(monkeypatch, clock, outage):
+    from github_gpt_issues.core import CircuitOpenError
+
+    calls = []
+    state = {"down": True}
+
+    def create(**kwargs):
+        calls.append(1)
+        if state["down"]:
+            raise outage()
+        return "up"
+
+    monkeypatch.setattr(core_module, "_chat_completion", create)
+    monkeypatch.setattr(core_module, "_collect_stream", lambda response: response)
+
+    def request():
+        return core_module._request_message(True, model="gpt-test", messages=[])
+
+    for _ in range(core_module.CIRCUIT_FAILURES):
+        with pytest.raises(type(outage())):
+            request()
+    with pytest.raises(CircuitOpenError):
+        request()
+    assert len(calls) == core_module.CIRCUIT_FAILURES
+
+    # After the reset period a single trial call is let through
+    clock.sleep(core_module.CIRCUIT_RESET_SECONDS)
+    state["down"] = False
+    assert request() == "up"
+    assert request() == "up"
+    assert len(calls) == core_module.CIRCUIT_FAILURES + 2
+
+
+def test_open_circuit_not_logged_per_story(monkeypatch, clock, caplog):
+    """Stories skipped by an open breaker log no ERROR; the opening warned once"""
+    calls = []
+    monkeypatch.setattr(core_module, "_chat_completion", lambda **k: calls.append(k))
+    caplog.set_level("DEBUG", logger="github_gpt_issues.core")
+    for _ in range(core_module.CIRCUIT_FAILURES):
+        core_module._OPENAI_BREAKER.record(True)
+
+    bodies = [core_module.expand_story(f"As a user, want {i}") for i in range(5)]
+
+    assert calls == []
+    assert all(b.endswith("**Failed to expand story**") for b in bodies)
+    assert [r for r in caplog.records if r.levelname == "ERROR"] == []
+    warnings = [r for r in caplog.records if r.levelname == "WARNING"]
+    assert [r.getMessage() for r in warnings] == [
+        f"{core_module.CIRCUIT_FAILURES} OpenAI failures in a row; pausing calls for "
+        f"{core_module.CIRCUIT_RESET_SECONDS:.0f}s"
+    ]
+
+
+def test_circuit_breaker_ignores_request_errors(monkeypatch):
+    """Bad requests neither count as outages nor reset the failure count"""
+    errors = [
+        core_module.Timeout("Request timed out"),
+        ValueError("bad payload"),
+        _server_error(400),
+        core_module.Timeout("Request timed out"),
+    ]
+
+    def create(**kwargs):
+        raise errors.pop(0)
+
+    monkeypatch.setattr(core_module, "_chat_completion", create)
+
+    for _ in range(4):
+        with pytest.raises(Exception):
+            core_module._request_message(False, model="gpt-test", messages=[])
+
+    assert core_module._OPENAI_BREAKER.failures == 2
+
+
+def test_expand_story_falls_back_while_circuit_open(monkeypatch, clock):
+    from github_gpt_issues.core import expand_story
+
+    def unavailable(**kwargs):
+        raise core_module.APIError("502 Bad Gateway")
+
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", unavailable)
+    monkeypatch.setattr(core_module, "_OPENAI_BREAKER", core_module._CircuitBreaker(2))
+
+    first = expand_story("As a user, want down")
+    slept = len(clock.sleeps)
+    second = expand_story("As a user, want still down")
+
+    assert first == "As a user, want down\n\n**Failed to expand story**"
+    assert second.endswith("**Failed to expand story**")
+    # The open circuit skips the second story's retries and backoff
+    assert len(clock.sleeps) == slept
+
+
+def test_openai_requests_capped_across_nested_pools(monkeypatch):
+    """Nested worker pools never put more than GGI_CONCURRENCY calls in flight"""
+    import threading
+    import time
+    from github_gpt_issues.core import _expand_stories_concurrently
+
+    monkeypatch.setenv("GGI_CONCURRENCY", "2")
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+    real_create = core_module.openai.ChatCompletion.create
+
+    def slow_create(**kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.02)
+        with lock:
+            active["now"] -= 1
+        return real_create(**kwargs)
+
+    monkeypatch.setattr(core_module.openai.ChatCompletion, "create", slow_create)
+    lines = [f"As a user, want {i}" for i in range(8)]
+
+    result = _expand_stories_concurrently(lines, max_workers=8)
+
+    assert set(result) == set(lines)
+    assert active["peak"] == 2
+
+
+def test_github_writes_capped_across_sections(dummy_repo, monkeypatch):
+    """Sections and their issue pools never exceed GGI_CONCURRENCY GitHub writes"""
+    import threading
+    import time
+    from github_gpt_issues.core import create_all_milestones_and_issues
+
+    monkeypatch.setenv("GGI_CONCURRENCY", "2")
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+    real_create = dummy_repo.create_issue
+
+    def slow_create(**kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.02)
+        with lock:
+            active["now"] -= 1
+            return real_create(**kwargs)
+
+    monkeypatch.setattr(dummy_repo, "create_issue", slow_create)
+    sections = [
+        {"title": f"Epic {s}", "stories": [f"As a dev, want {s}-{n}" for n in range(4)]}
+        for s in range(4)
+    ]
+
+    create_all_milestones_and_issues(
+        dummy_repo, sections, "gpt-test", set(), max_sections=4, max_workers=4
+    )
+
+    assert len(dummy_repo.issues) == 16
+    assert active["peak"] == 2
+
+
+def test_partial_openai_error_module_keeps_retryable_errors():
+    """An SDK missing an outage error still retries its real rate-limit errors"""
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, types, openai\n"
+        "errors = types.ModuleType('openai.error')\n"
+        "class RateLimitError(Exception): pass\n"
+        "class APIError(Exception): pass\n"
+        "class Timeout(Exception): pass\n"
+        "errors.RateLimitError, errors.APIError = RateLimitError, APIError\n"
+        "errors.Timeout = Timeout\n"
+        "sys.modules['openai.error'] = openai.error = errors\n"
+        "import github_gpt_issues.core as core\n"
+        "print(core.RateLimitError is RateLimitError, core.APIError is APIError,\n"
+        "      core.Timeout is Timeout, issubclass(core.TryAgain, Exception))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd="src",
+        check=True,
+    ).stdout
+    assert out.split() == ["True", "True", "True", "True"]